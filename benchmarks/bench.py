@@ -0,0 +1,348 @@
+"""Benchmark case generation over the preset outlines.
+
+Each preset is built in a fresh subprocess (so peak memory is per preset), with
+its matching config, and the profile of every stage is recorded. The results
+can be saved as a baseline and later runs compared against it:
+
+    python benchmarks/bench.py record -o benchmarks/baseline.json
+    python benchmarks/bench.py compare benchmarks/baseline.json
+
+CLI startup is also recorded, by running ``snakeskin --help`` under
+``python -X importtime``, so heavy imports creeping back into the startup path
+show up as a regression.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+bench_dir = Path(__file__).parent
+repo_dir = bench_dir.parent
+src_dir = repo_dir / "src"
+default_outline_dir = repo_dir / "preset_outlines"
+default_config_dir = repo_dir / "preset_configs"
+default_baseline = bench_dir / "baseline.json"
+
+# Bump this if the layout of the results file changes.
+results_format_version = 1
+
+# Imports listed as the slowest at startup.
+slowest_import_count = 5
+
+# Changes smaller than this are treated as noise, however large relative to the
+# baseline.
+min_seconds = 0.1
+min_rss_mb = 20
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "_preset":
+        return _run_preset(args.svg, args.config, args.output)
+    if args.command == "record":
+        results = record(args.presets, args.repeat)
+        write_results(results, args.output)
+        return 1 if _failed(results) else 0
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    if args.current:
+        current = json.loads(Path(args.current).read_text())
+    else:
+        current = record(args.presets or list(baseline["presets"]), args.repeat)
+        if args.output:
+            write_results(current, args.output)
+    regressions = compare(baseline, current, args.threshold)
+    print(format_comparison(baseline, current, regressions, args.threshold))
+    return 1 if regressions or _failed(current) else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark case generation over the preset outlines."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser(
+        "record", help="Build the presets and record the time and peak memory of each stage."
+    )
+    record_parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=default_baseline,
+        help=f"File to write the results to. Defaults to {default_baseline}.",
+    )
+
+    compare_parser = commands.add_parser(
+        "compare",
+        help="Compare results against a baseline, exiting with an error if any stage regressed.",
+    )
+    compare_parser.add_argument("baseline", type=Path, help="Results to compare against.")
+    compare_parser.add_argument(
+        "current",
+        type=Path,
+        nargs="?",
+        help="Results to compare. If not given, the presets in the baseline are built now.",
+    )
+    compare_parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="File to write the results of a new run to.",
+    )
+    compare_parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Fractional increase in time or peak memory over the baseline to count as a regression. Defaults to 0.2.",
+    )
+
+    for p in (record_parser, compare_parser):
+        p.add_argument(
+            "-p",
+            "--presets",
+            nargs="+",
+            help="Names of the presets to build. Defaults to all of them.",
+        )
+        p.add_argument(
+            "-r",
+            "--repeat",
+            type=int,
+            default=1,
+            help="Build each preset this many times and keep the fastest time for each stage. Defaults to 1.",
+        )
+
+    # Used internally to build one preset in a subprocess.
+    preset_parser = commands.add_parser("_preset")
+    preset_parser.add_argument("svg", type=Path)
+    preset_parser.add_argument("config", type=Path, nargs="?")
+    preset_parser.add_argument("--output", type=Path, required=True)
+    return parser.parse_args(argv)
+
+
+def record(presets=None, repeat=1):
+    """Build each preset repeat times, returning the results dict."""
+    results = {
+        "version": results_format_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "startup": measure_startup(repeat),
+        "presets": {},
+    }
+    for svg in sorted(default_outline_dir.glob("*.svg")):
+        if presets and svg.stem not in presets:
+            continue
+        config = default_config_dir / svg.with_suffix(".json").name
+        runs = []
+        for i in range(repeat):
+            print(f"Building {svg.stem} ({i + 1}/{repeat})...", flush=True)
+            runs.append(_build(svg, config if config.exists() else None))
+        result = _combine_runs(runs)
+        if result["error"]:
+            print(f"{svg.stem} failed: {result['error']}")
+        else:
+            print(f"{svg.stem}: {result['seconds']:.1f} s, {result['peak_rss_mb']:.0f} MB")
+        results["presets"][svg.stem] = result
+    return results
+
+
+def measure_startup(repeat=1):
+    """Time `snakeskin --help` in a fresh interpreter, keeping the fastest of
+    repeat runs, along with the top-level imports that took the longest."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", str(src_dir / "snakeskin.py"), "--help"],
+            capture_output=True,
+            text=True,
+        )
+        seconds = time.perf_counter() - start
+        if proc.returncode:
+            lines = proc.stderr.strip().splitlines()
+            return {"error": lines[-1] if lines else f"exit code {proc.returncode}"}
+        imports = _parse_importtime(proc.stderr)
+        if best is None or seconds < best["seconds"]:
+            best = {
+                "error": None,
+                "seconds": seconds,
+                "import_seconds": sum(imports.values()),
+                "slowest_imports": dict(
+                    sorted(imports.items(), key=lambda i: i[1], reverse=True)[
+                        :slowest_import_count
+                    ]
+                ),
+            }
+    print(f"Startup: {best['seconds']:.2f} s, of which {best['import_seconds']:.2f} s importing")
+    return best
+
+
+def _parse_importtime(stderr):
+    """Cumulative seconds of each top-level import from -X importtime output,
+    whose lines look like `import time:  self [us] | cumulative | name`, with
+    nested imports indented."""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if name.startswith(" ") and not name.startswith("  ") and cumulative.strip().isdigit():
+            imports[name.strip()] = int(cumulative) / 1e6
+    return imports
+
+
+def write_results(results, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {path}")
+
+
+def compare(baseline, current, threshold):
+    """Return a list of (preset, stage, metric, baseline, current) for each
+    regression beyond the threshold."""
+    regressions = []
+    base, cur = baseline.get("startup"), current.get("startup")
+    if base and cur and not base["error"] and not cur["error"]:
+        if (
+            cur["seconds"] > base["seconds"] * (1 + threshold)
+            and cur["seconds"] - base["seconds"] > min_seconds
+        ):
+            regressions.append(("startup", "total", "seconds", base["seconds"], cur["seconds"]))
+    for name, base in baseline["presets"].items():
+        cur = current["presets"].get(name)
+        if cur is None or base["error"] or cur["error"]:
+            continue
+        pairs = [("total", base, cur)]
+        pairs += [
+            (stage, base["stages"][stage], cur["stages"][stage])
+            for stage in base["stages"]
+            if stage in cur["stages"]
+        ]
+        for stage, b, c in pairs:
+            for metric, floor in (("seconds", min_seconds), ("peak_rss_mb", min_rss_mb)):
+                if b[metric] is None or c[metric] is None:
+                    continue
+                if c[metric] > b[metric] * (1 + threshold) and c[metric] - b[metric] > floor:
+                    regressions.append((name, stage, metric, b[metric], c[metric]))
+    return regressions
+
+
+def format_comparison(baseline, current, regressions, threshold):
+    name_w = max([len("startup"), *(len(n) for n in current["presets"])])
+    lines = [
+        f"{'preset':<{name_w}}  {'base (s)':>8}  {'now (s)':>8}  {'change':>7}  {'base (MB)':>9}  {'now (MB)':>9}"
+    ]
+    lines.append("-" * len(lines[0]))
+    for name, cur in current["presets"].items():
+        base = baseline["presets"].get(name)
+        if base is None:
+            lines.append(f"{name:<{name_w}}  not in baseline")
+            continue
+        if base["error"] or cur["error"]:
+            lines.append(f"{name:<{name_w}}  FAILED: {cur['error'] or base['error']}")
+            continue
+        change = cur["seconds"] / base["seconds"] - 1
+        lines.append(
+            f"{name:<{name_w}}  {base['seconds']:>8.2f}  {cur['seconds']:>8.2f}  {change:>+7.0%}"
+            f"  {base['peak_rss_mb']:>9.0f}  {cur['peak_rss_mb']:>9.0f}"
+        )
+    base, cur = baseline.get("startup"), current.get("startup")
+    if base and cur and not base["error"] and not cur["error"]:
+        change = cur["seconds"] / base["seconds"] - 1
+        lines.append(
+            f"{'startup':<{name_w}}  {base['seconds']:>8.2f}  {cur['seconds']:>8.2f}  {change:>+7.0%}"
+        )
+    lines.append("")
+    if not regressions:
+        lines.append(f"No regressions beyond {threshold:.0%}.")
+    else:
+        lines.append(f"Regressions beyond {threshold:.0%}:")
+        for name, stage, metric, b, c in regressions:
+            lines.append(f"  {name} {stage} {metric}: {b:.2f} -> {c:.2f} ({c / b - 1:+.0%})")
+    return "\n".join(lines)
+
+
+def _build(svg, config):
+    """Build one preset in a fresh interpreter and return its results."""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "result.json"
+        cmd = [sys.executable, __file__, "_preset", str(svg)]
+        if config:
+            cmd.append(str(config))
+        proc = subprocess.run(
+            cmd + ["--output", str(output)], capture_output=True, text=True
+        )
+        if not output.exists():
+            lines = (proc.stderr or proc.stdout).strip().splitlines()
+            return {"error": lines[-1] if lines else f"exit code {proc.returncode}"}
+        return json.loads(output.read_text())
+
+
+def _run_preset(svg, config, output):
+    """Build a preset in this process and write its profile to output."""
+    start = time.perf_counter()
+    sys.path.insert(0, str(src_dir))
+    import profiling
+    from generate_pcb_case import generate_cases
+
+    import_seconds = time.perf_counter() - start
+    params = json.loads(config.read_text()) if config else {}
+    error = None
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep benchmark output out of the real build dir.
+        params["output_dir"] = Path(tmp)
+        with profiling.profile() as report:
+            try:
+                generate_cases(svg, user_params=params)
+            except (Exception, SystemExit) as e:
+                error = f"{type(e).__name__}: {e}".splitlines()[0]
+    stages = {"module_import": {"seconds": import_seconds, "peak_rss_mb": None, "calls": 1}}
+    for s in report.stages:
+        # Stages that run more than once (e.g. both exports) are summed.
+        stage = stages.setdefault(
+            s["name"], {"seconds": 0, "peak_rss_mb": s["peak_rss_mb"], "calls": 0}
+        )
+        stage["seconds"] += s["seconds"]
+        stage["calls"] += 1
+        if s["peak_rss_mb"] is not None:
+            stage["peak_rss_mb"] = max(stage["peak_rss_mb"], s["peak_rss_mb"])
+    result = {
+        "error": error,
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": profiling._peak_rss_mb(),
+        "stages": stages,
+        "counters": report.counters,
+    }
+    Path(output).write_text(json.dumps(result))
+    return 1 if error else 0
+
+
+def _combine_runs(runs):
+    """Keep the fastest time of each stage over repeated runs, which is the
+    least affected by noise."""
+    errors = [r["error"] for r in runs if r["error"]]
+    if errors:
+        return {"error": errors[0]}
+    combined = runs[0]
+    for run in runs[1:]:
+        combined["seconds"] = min(combined["seconds"], run["seconds"])
+        for name, stage in run["stages"].items():
+            if name in combined["stages"]:
+                best = combined["stages"][name]
+                best["seconds"] = min(best["seconds"], stage["seconds"])
+    return combined
+
+
+def _failed(results):
+    startup_error = results.get("startup", {}).get("error")
+    return bool(startup_error) or any(r["error"] for r in results["presets"].values())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+try:
+    from build_cache import BuildCache, default_cache_dir
+    from default_params import default_params
+except ImportError:
+    from .build_cache import BuildCache, default_cache_dir
+    from .default_params import default_params
+
+script_dir = Path(__file__).parent
+default_outline_dir = script_dir / "../preset_outlines"
+default_config_dir = script_dir / "../preset_configs"
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    outline_dir = Path(args.outline_dir).expanduser()
+    config_dir = Path(args.config_dir).expanduser()
+    jobs = find_jobs(outline_dir, config_dir)
+    if not jobs:
+        print(f"No .svg outlines found in {outline_dir}")
+        return 1
+    build_cache = None if args.no_cache else BuildCache(args.cache_dir)
+
+    workers = min(args.jobs or os.cpu_count() or 1, len(jobs))
+    print(f"Building {len(jobs)} presets with {workers} workers...")
+    results = []
+    start = time.perf_counter()
+    while jobs:
+        jobs = _run_jobs(jobs, workers, build_cache, results)
+    total = time.perf_counter() - start
+
+    results.sort(key=lambda r: r["name"])
+    summary = format_summary(results, total)
+    print(summary)
+    summary_path = Path(args.summary).expanduser()
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    summary_path.write_text(summary)
+    print(f"Summary written to {summary_path}")
+    return 1 if any(r["error"] for r in results) else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="snakeskin batch",
+        description="Build cases for every outline in a directory concurrently, using the config json with the same name (if there is one).",
+    )
+    parser.add_argument(
+        "outline_dir",
+        nargs="?",
+        type=Path,
+        default=default_outline_dir,
+        help="Directory of .svg outlines to build. Defaults to the preset outlines.",
+    )
+    parser.add_argument(
+        "--config-dir",
+        type=Path,
+        default=default_config_dir,
+        help="Directory of .json configs, matched to outlines by file name. Defaults to the preset configs.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--summary",
+        type=Path,
+        default=default_params["output_dir"] / "batch_summary.txt",
+        help="File to write the summary table to.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rebuild every part from scratch, without reading or writing the build cache.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=default_cache_dir,
+        help=f"Directory to cache generated parts in between runs. Defaults to {default_cache_dir}.",
+    )
+    return parser.parse_args(argv)
+
+
+def find_jobs(outline_dir, config_dir):
+    """Pair each outline with its config, if any."""
+    jobs = []
+    for svg in sorted(outline_dir.glob("*.svg")):
+        config = config_dir / svg.with_suffix(".json").name
+        jobs.append((svg, config if config.exists() else None))
+    return jobs
+
+
+def format_summary(results, total_seconds):
+    name_w = max([len("preset"), *(len(r["name"]) for r in results)])
+    lines = [f"{'preset':<{name_w}}  {'status':<6}  {'time (s)':>8}  error"]
+    lines.append("-" * len(lines[0]))
+    for r in results:
+        status = "ok" if r["error"] is None else "FAILED"
+        error = r["error"] or ""
+        lines.append(
+            f"{r['name']:<{name_w}}  {status:<6}  {r['seconds']:>8.1f}  {error}".rstrip()
+        )
+    failed = sum(1 for r in results if r["error"])
+    lines.append("-" * len(lines[0]))
+    lines.append(
+        f"{len(results) - failed}/{len(results)} succeeded, {total_seconds:.1f} s total"
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _run_jobs(jobs, workers, build_cache, results):
+    """Build jobs in a new pool of workers, adding their results to results.
+
+    A worker crashing (e.g. a segfault in OCCT, or being killed for running
+    out of memory) breaks the whole pool. The presets that were building when
+    it did are recorded as failed, and the ones that hadn't started yet are
+    returned to be built in a new pool."""
+    started = multiprocessing.SimpleQueue()
+    unfinished = []
+    start = time.perf_counter()
+    # Workers are reused between presets, so each only pays the CAD import cost
+    # once.
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(jobs)),
+        initializer=_init_worker,
+        initargs=(started,),
+    ) as pool:
+        futures = {
+            pool.submit(_build_preset, svg, config, build_cache): (svg, config)
+            for svg, config in jobs
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                unfinished.append(futures[future])
+                continue
+            _print_result(result)
+            results.append(result)
+    if not unfinished:
+        return []
+
+    started_names = set()
+    while not started.empty():
+        started_names.add(started.get())
+    crashed = [job for job in unfinished if job[0].stem in started_names]
+    if not crashed:
+        # It crashed before any preset started, so would again.
+        crashed = unfinished
+    for svg, _ in crashed:
+        result = {
+            "name": svg.stem,
+            "seconds": time.perf_counter() - start,
+            "error": "BrokenProcessPool: a worker process crashed while this was building (e.g. it ran out of memory)",
+        }
+        _print_result(result)
+        results.append(result)
+    to_retry = [job for job in unfinished if job not in crashed]
+    if to_retry:
+        print(f"A worker process crashed, building the other {len(to_retry)} presets in new workers...")
+    return to_retry
+
+
+def _print_result(result):
+    status = "ok" if result["error"] is None else "FAILED"
+    print(f"Finished {result['name']} ({status}) in {result['seconds']:.1f} s")
+
+
+_started = None
+
+
+def _init_worker(started):
+    # Pay the CAD import cost once per worker rather than once per preset.
+    global _started
+    _started = started
+    try:
+        import generate_pcb_case
+    except ImportError:
+        from . import generate_pcb_case
+
+
+def _build_preset(svg, config, build_cache):
+    try:
+        from generate_pcb_case import generate_cases
+    except ImportError:
+        from .generate_pcb_case import generate_cases
+
+    # Sent before building, so the parent knows which presets were building if
+    # this worker crashes.
+    _started.put(svg.stem)
+    start = time.perf_counter()
+    error = None
+    try:
+        params = json.loads(config.read_text()) if config else {}
+        generate_cases(svg, user_params=params, build_cache=build_cache)
+    except (Exception, SystemExit) as e:
+        traceback.print_exc()
+        error = f"{type(e).__name__}: {e}".splitlines()[0]
+    return {
+        "name": svg.stem,
+        "seconds": time.perf_counter() - start,
+        "error": error,
+    }
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from functools import cache
+from pathlib import Path
+
+# Bump this if the layout of cache entries changes.
+cache_format_version = 1
+
+default_cache_dir = (
+    Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser() / "snakeskin"
+)
+default_max_bytes = 2 * 1024**3
+
+script_dir = Path(__file__).parent
+
+
+class BuildCache:
+    """Persistent, content-addressed cache of generated solids.
+
+    Entries are keyed on the hash of the input outline, the values of only the
+    params a stage reads, and the source of this package (so code changes
+    invalidate old results). Each entry is a directory of BREP files, one per
+    shape. The least recently used entries are evicted once the cache grows
+    past max_bytes.
+    """
+
+    def __init__(self, cache_dir=default_cache_dir, max_bytes=default_max_bytes):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, stage, input_hash, params):
+        return cache_key(stage, input_hash, params)
+
+    def load(self, key):
+        """Return the list of shapes stored under key, or None on a miss."""
+        from build123d import import_brep
+
+        entry = self.cache_dir / key
+        try:
+            files = sorted(entry.glob("*.brep"), key=lambda f: int(f.stem))
+            if not files:
+                return None
+            shapes = [import_brep(str(f)) for f in files]
+            # Mark as recently used for eviction.
+            os.utime(entry)
+        except (OSError, ValueError):
+            # Treat a damaged or concurrently evicted entry as a miss.
+            return None
+        return shapes
+
+    def store(self, key, shapes):
+        from build123d import export_brep
+
+        entry = self.cache_dir / key
+        if entry.exists():
+            return
+        # Write to a temporary dir then rename, so other processes building the
+        # same key never see a partial entry.
+        tmp = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp_"))
+        try:
+            for i, shape in enumerate(shapes):
+                export_brep(shape, str(tmp / f"{i}.brep"))
+            tmp.rename(entry)
+        except OSError:
+            # Another process got there first.
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until under the size limit."""
+        entries = []
+        total = 0
+        for entry in self.cache_dir.iterdir():
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except OSError:
+                continue
+            total += size
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+def cache_key(stage, input_hash, params):
+    """Key for a stage, from the hash of its input file and the dict of params
+    it reads."""
+    h = hashlib.sha256()
+    h.update(str(cache_format_version).encode())
+    h.update(_source_hash().encode())
+    h.update(stage.encode())
+    h.update(str(input_hash).encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def file_hash(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+@cache
+def _source_hash():
+    h = hashlib.sha256()
+    for f in sorted(script_dir.glob("*.py")):
+        h.update(f.read_bytes())
+    return h.hexdigest()
@@ -0,0 +1,81 @@
+"""Immutable case params, passed explicitly to everything that builds a part.
+
+Config is a read-only Mapping of param names to values, so it is read like the
+default_params dict it is made from. Lists are frozen into tuples, and it
+hashes by the contents, so it can be a key of functools.cache and the same
+params hash the same in every process.
+"""
+import hashlib
+import json
+from collections.abc import Mapping
+
+
+class Config(Mapping):
+    __slots__ = ("_params", "_scope", "_digest")
+
+    def __init__(self, params=(), **overrides):
+        params = {**dict(params), **overrides}
+        object.__setattr__(
+            self, "_params", {k: _freeze(v) for k, v in sorted(params.items())}
+        )
+        object.__setattr__(self, "_scope", None)
+        object.__setattr__(self, "_digest", None)
+
+    def __getitem__(self, key):
+        try:
+            return self._params[key]
+        except KeyError:
+            if self._scope is None:
+                raise
+            raise KeyError(
+                f"'{key}' isn't one of the params declared by {self._scope}"
+            ) from None
+
+    def __iter__(self):
+        return iter(self._params)
+
+    def __len__(self):
+        return len(self._params)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Config is immutable; use updated() for a changed copy")
+
+    def __eq__(self, other):
+        if not isinstance(other, Config):
+            return NotImplemented
+        return self._params == other._params
+
+    def __hash__(self):
+        return int(self.digest()[:16], 16)
+
+    def __repr__(self):
+        return f"Config({self._params!r})"
+
+    def __reduce__(self):
+        return (Config, (self._params,))
+
+    def updated(self, params=(), **overrides):
+        """Copy with some params added or replaced."""
+        return Config({**self._params, **dict(params), **overrides})
+
+    def restricted(self, keys, scope=None):
+        """Copy with only the params in keys. Reading any other param raises a
+        KeyError naming scope (e.g. the stage that declared keys)."""
+        config = Config({k: self[k] for k in keys})
+        object.__setattr__(config, "_scope", scope)
+        return config
+
+    def digest(self):
+        """Hex digest of the params, the same in every process."""
+        if self._digest is None:
+            encoded = json.dumps(self._params, sort_keys=True, default=str)
+            object.__setattr__(
+                self, "_digest", hashlib.sha256(encoded.encode()).hexdigest()
+            )
+        return self._digest
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
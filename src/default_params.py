@@ -17,7 +17,20 @@ default_params = {
     "tenting_stand": False,
     "tiny_edge_rounding": False,
     "simplify_beziers": False,
+    "reduce_outline_edges": False,
+    "outline_reduction_tolerance": 0.02,
     "output_filetype": ".stl",
+    "preview": "final",
+    "mesh_tolerance": 1e-3,
+    "mesh_angular_tolerance": 0.1,
+    # Seconds a single CAD operation may take before its fallback is used, or
+    # 0 for no limit.
+    "operation_timeout": 0.0,
+    # Run booleans on several threads, and glue together faces closer than
+    # boolean_fuzzy (mm) when cutting or adding, which can fix booleans that
+    # fail on nearly coincident faces.
+    "boolean_parallel": True,
+    "boolean_fuzzy": 0.0,
     "base_z_thickness": 2,
     "wall_xy_thickness": 2.81,
     "wall_z_height": 4.0,
@@ -56,3 +69,8 @@ default_params = {
     "tent_hinge_nut_l": 2.4,
     "tent_hinge_nut_d": 5.5,
 }
+
+# Allowed values of params that only take a few options.
+param_choices = {
+    "preview": ["draft", "medium", "final"],
+}
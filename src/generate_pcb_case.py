@@ -1,21 +1,51 @@
 import copy
 import math
 import os
-from functools import cache
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
+import svgpathtools as svg
 from build123d import *
 import OCP
+from OCP.BRepAdaptor import BRepAdaptor_CompCurve
+from OCP.BRepAlgoAPI import BRepAlgoAPI_Cut, BRepAlgoAPI_Fuse
+from OCP.GCPnts import GCPnts_QuasiUniformDeflection
+from OCP.TopTools import TopTools_ListOfShape
 
 try:
-    from default_params import default_params
-    from import_svg import import_svg_as_forced_outline
+    from build_cache import cache_key, file_hash
+    from config import Config
+    from default_params import default_params, param_choices
+    from gerber import gerber_suffixes, read_outline
+    from import_svg import (
+        _reduce_edges,
+        import_curves_as_forced_outline,
+        import_svg_as_forced_outline,
+    )
+    from kicad_pcb import read_edge_cuts
+    import mesh_export
+    from profiling import profiled, stage
+    import profiling
+    import stage_cache
+    from timeouts import OperationTimeout, set_time_limit, with_timeout
 except ImportError:
-    from .default_params import default_params
-    from .import_svg import import_svg_as_forced_outline
-
+    from .build_cache import cache_key, file_hash
+    from .config import Config
+    from .default_params import default_params, param_choices
+    from .gerber import gerber_suffixes, read_outline
+    from .import_svg import (
+        _reduce_edges,
+        import_curves_as_forced_outline,
+        import_svg_as_forced_outline,
+    )
+    from .kicad_pcb import read_edge_cuts
+    from . import mesh_export
+    from .profiling import profiled, stage
+    from . import profiling
+    from . import stage_cache
+    from .timeouts import OperationTimeout, set_time_limit, with_timeout
 
-cfg = default_params
 
 Loc = Location
 
@@ -23,7 +53,12 @@ tent_leg_cutout_tolerance = 0.3
 misc_tol = 0.2
 
 test_print = False
-fast_render = False
+# Max distance the simplified outline used for draft previews strays from the
+# real one.
+draft_outline_tolerance = 0.05
+# Minimum (linear, angular) mesh tolerances for each preview level, for faster,
+# smaller exports.
+preview_mesh_tolerances = {"draft": (0.01, 0.5), "medium": (3e-3, 0.2)}
 # For test prints, slice off the end. Tweak this by hand to get what you want.
 if test_print:
     slice = Loc((-55, 0, 0)) * Box(
@@ -56,22 +91,37 @@ test_overrides = {
     "magnet_count": 1,
 }
 
+# Whether booleans run on several threads, set from the boolean_parallel param.
+# Not a param of the stages, as it doesn't change their result.
+boolean_parallel = True
+
 magnet_height = 2
 magnet_radius = 4 / 2
 magnet_radius_y = magnet_radius + 0.3
 
 
-def import_svg_as_face(path):
-    """Import SVG as paths and convert to build123d face. Although build123d has a native SVG import, it doesn't create clean wire connections from kicad exports of some shapes (in my experience), causing some more advanced operations to fail (e.g. tapers).
+@profiled("import_outline")
+def import_svg_as_face(cfg, path):
+    """Import SVG as paths (or the Edge.Cuts of a .kicad_pcb or the outline
+    drawn in a Gerber, see kicad_pcb and gerber) and convert to build123d face. Although build123d has a native SVG import, it doesn't create clean wire connections from kicad exports of some shapes (in my experience), causing some more advanced operations to fail (e.g. tapers).
     This is how I used to do it, using b123d import:
     # Round trip from outline to wires to face to wires to connect the disconnected
     # edges that an svg gets imported with.
     outline = import_svg(script_dir / "build/outline.svg")
     outline = make_face(outline.wires()).wire().fix_degenerate_edges(0.01)
     """
-    face = import_svg_as_forced_outline(
-        path, extra_cleaning=False, simplify_beziers=cfg["simplify_beziers"]
+    options = dict(
+        extra_cleaning=False,
+        simplify_beziers=cfg["simplify_beziers"],
+        reduce_edges=cfg["reduce_outline_edges"],
+        reduction_tolerance=cfg["outline_reduction_tolerance"],
     )
+    if Path(path).suffix == ".kicad_pcb":
+        face = import_curves_as_forced_outline(read_edge_cuts(path), **options)
+    elif Path(path).suffix in gerber_suffixes:
+        face = import_curves_as_forced_outline(read_outline(path), **options)
+    else:
+        face = import_svg_as_forced_outline(path, **options)
     # face = make_face(wire)
     # face = _fix_face_edges(face)
 
@@ -100,132 +150,523 @@ def import_svg_as_face(path):
                 face = offset(offset(face, off), -off)
             except RuntimeError:
                 pass
+    if cfg["preview"] == "draft":
+        face = _simplify_face(face, draft_outline_tolerance)
     return face
 
 
-def generate_cases(svg_file, user_params=None):
-    if not user_params:
-        user_params = {}
-    cfg.update(user_params)
+def _simplify_face(face, tolerance):
+    """Replace the curves of face with as few straight lines as possible while
+    staying within tolerance of the original (as the reduce_outline_edges
+    option does for imported outlines, see _reduce_edges), so later operations
+    are faster. Lines only, as the lip often fails to cut out of outlines
+    made of many short arcs. Returns face unchanged if that wouldn't reduce
+    the number of edges."""
+    # Imported outlines are sketches of one face.
+    original = face.face() if isinstance(face, Sketch) else face
+    z = original.center().Z
+    wires = []
+    for wire in [original.outer_wire(), *original.inner_wires()]:
+        polyline = [complex(x, y) for x, y in _wire_polyline(wire)]
+        lines = _reduce_edges(
+            [svg.Line(a, b) for a, b in zip(polyline, polyline[1:]) if a != b],
+            tolerance,
+            arcs=False,
+        )
+        if len(lines) < 3:
+            return face
+        # Lines shorter than tolerance may have been dropped, so join each to
+        # the end of the last, and close the wire back to the first.
+        points = [lines[0].start, *(line.end for line in lines[:-1])]
+        wires.append(Wire.make_polygon([(p.real, p.imag, z) for p in points], close=True))
+    simplified = Face.make_from_wires(wires[0], wires[1:])
+    # Outlines made of a few long curves are better left alone.
+    if len(simplified.edges()) >= len(original.edges()):
+        return face
+    print(
+        f"Simplified outline from {len(original.edges())} to {len(simplified.edges())} edges"
+    )
+    return simplified
+
+
+# The params each part reads while it is built, used to key the build cache so
+# that changing an unrelated param is still a cache hit. Keep these up to date
+# when adding params.
+outline_params = (
+    "preview",
+    "simplify_beziers",
+    "reduce_outline_edges",
+    "outline_reduction_tolerance",
+    "tiny_edge_rounding",
+)
+wall_params = (
+    "base_z_thickness",
+    "wall_xy_thickness",
+    "wall_z_height",
+    "z_space_under_pcb",
+    "chamfer_len",
+)
+lip_params = (
+    "carrycase_tolerance_xy",
+    "carrycase_wall_xy_thickness",
+    "flush_carrycase_lip",
+    "lip_len",
+    "lip_position_angles",
+)
+magnet_params = (
+    "magnet_position",
+    "magnet_separation_distance",
+    "magnet_spacing",
+    "magnet_count",
+)
+strap_loop_params = (
+    "strap_loop",
+    "strap_loop_thickness",
+    "strap_loop_end_offset",
+    "strap_loop_gap",
+)
+tenting_params = (
+    "tenting_stand",
+    "tent_legs",
+    "tent_hinge_position_offset",
+    "tent_hinge_width",
+    "tent_hinge_bolt_d",
+    "tent_hinge_bolt_l",
+    "tent_hinge_bolt_head_d",
+    "tent_hinge_nut_l",
+    "tent_hinge_nut_d",
+)
+# Params of the stages that cut or add shapes with _boolean.
+boolean_params = ("boolean_fuzzy",)
+case_params = (
+    *outline_params,
+    *boolean_params,
+    *wall_params,
+    *lip_params,
+    *magnet_params,
+    *strap_loop_params,
+    *tenting_params,
+    "carrycase",
+    "wall_xy_bottom_tolerance",
+    "wall_xy_top_tolerance",
+    "cutout_position",
+    "cutout_width",
+    "additional_cutouts",
+    "honeycomb_base",
+    "honeycomb_radius",
+    "honeycomb_thickness",
+)
+carrycase_params = (
+    *outline_params,
+    *boolean_params,
+    *wall_params,
+    *lip_params,
+    *magnet_params,
+    *strap_loop_params,
+    *tenting_params,
+    "carrycase_tolerance_z",
+    "carrycase_z_gap_between_cases",
+    "carrycase_cutout_position",
+    "carrycase_cutout_xy_width",
+)
+tenting_flap_params = (
+    *outline_params,
+    *wall_params,
+    *strap_loop_params,
+    *tenting_params,
+)
+# Params read by the stages within the parts, which are memoised separately so
+# that changing a param only rebuilds the stages that read it (see
+# stage_cache).
+friction_fit_params = (
+    "wall_z_height",
+    "z_space_under_pcb",
+    "wall_xy_top_tolerance",
+    "wall_xy_bottom_tolerance",
+)
+honeycomb_params = ("preview", "honeycomb_base", "honeycomb_radius", "honeycomb_thickness")
+case_walls_params = (*wall_params, *friction_fit_params, "preview")
+case_body_params = (*case_walls_params, *honeycomb_params)
+wall_cutout_params = (
+    *boolean_params,
+    "preview",
+    "wall_xy_thickness",
+    "cutout_position",
+    "cutout_width",
+    "additional_cutouts",
+)
+lip_stage_params = (
+    *lip_params,
+    "preview",
+    "wall_xy_thickness",
+    "chamfer_len",
+)
+magnet_stage_params = (
+    *magnet_params,
+    "wall_xy_thickness",
+    "base_z_thickness",
+    "carrycase_tolerance_xy",
+)
+carrycase_body_params = (
+    *wall_params,
+    "preview",
+    "carrycase_tolerance_xy",
+    "carrycase_tolerance_z",
+    "carrycase_wall_xy_thickness",
+    "carrycase_z_gap_between_cases",
+)
+carrycase_cutout_params = (
+    "preview",
+    "carrycase_cutout_position",
+    "carrycase_cutout_xy_width",
+    "carrycase_wall_xy_thickness",
+)
+tent_hinge_params = (
+    *tenting_params,
+    "base_z_thickness",
+    "wall_xy_thickness",
+    "chamfer_len",
+)
+tenting_flap_shadow_params = (
+    *tent_hinge_params,
+    *strap_loop_params,
+    "base_z_thickness",
+)
+
+
+def generate_cases(
+    svg_file,
+    user_params=None,
+    build_cache=None,
+    jobs=1,
+    skip_unchanged=False,
+    progress=None,
+):
+    """Generate and export all the parts for the outline in svg_file, with
+    user_params overriding the default params. If a BuildCache is given, parts
+    are loaded from it where possible rather than rebuilt. With jobs > 1,
+    independent parts are built in parallel worker processes. With
+    skip_unchanged, parts this process has already exported with the same
+    params are not exported again (e.g. for watch mode). If given, progress is
+    called with the name of each part as it is finished, the number of parts
+    finished and the total. Returns the Config the parts were built with."""
+    cfg = Config(default_params).updated(user_params or {})
     if test_print:
-        cfg.update(test_overrides)
+        cfg = cfg.updated(test_overrides)
+    assert (
+        cfg["preview"] in param_choices["preview"]
+    ), f"preview must be one of {param_choices['preview']}, not '{cfg['preview']}'"
+
+    stage_cache.use_build_cache(build_cache)
+    # Not a param of the stages it limits, as it doesn't change their result
+    # (and results of operations that time out aren't cached).
+    set_time_limit(cfg["operation_timeout"])
+    global boolean_parallel
+    boolean_parallel = cfg["boolean_parallel"]
+    outline = _Outline(svg_file, cfg)
+    parts = ["case"]
+    if cfg["carrycase"]:
+        parts.append("carrycase")
+    if cfg["tenting_stand"]:
+        parts.append("tenting_flaps")
+
+    if jobs > 1 and len(parts) > 1:
+        # Import once here rather than in every worker.
+        outline.face()
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(parts)),
+            initializer=_init_worker,
+            initargs=(build_cache, cfg["operation_timeout"], cfg["boolean_parallel"]),
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _generate_part_in_worker,
+                    cfg,
+                    part,
+                    outline,
+                    build_cache,
+                    profiling.enabled(),
+                )
+                for part in parts
+            ]
+            meshes = []
+            for i, (part, future) in enumerate(zip(parts, futures)):
+                part_meshes, report = future.result()
+                meshes += part_meshes
+                if report:
+                    profiling.merge(report)
+                if progress:
+                    progress(part, i + 1, len(parts))
+    else:
+        meshes = []
+        for i, part in enumerate(parts):
+            meshes += _generate_part(cfg, part, outline, build_cache, skip_unchanged)
+            if progress:
+                progress(part, i + 1, len(parts))
+
+    if cfg["output_filetype"] == ".3mf":
+        bundle_path = cfg["output_dir"] / outline.svg_file.stem / outline.svg_file.stem
+        bundle_path = bundle_path.with_suffix(".3mf")
+        print(f"Writing all parts to {bundle_path}...")
+        with stage("export_3mf"):
+            mesh_export.write_3mf(bundle_path, meshes)
+
+    return cfg
+
+
+class _Outline:
+    """The input outline, which is only imported (with the outline params of
+    cfg) the first time it is needed so that fully cached builds can skip it."""
+
+    def __init__(self, svg_file, cfg):
+        self.svg_file = Path(svg_file)
+        self.hash = file_hash(svg_file)
+        self.cfg = cfg
+        self._face = None
+        self._face_key = None
+
+    def face(self):
+        if self._face is None:
+            self._face = _import_outline(self.cfg, self.hash, self.svg_file)
+            self._face_key = stage_cache.source(self._face)
+        elif stage_cache.source(self._face) is None:
+            # Copied into a worker process, which doesn't know where it came
+            # from.
+            stage_cache.set_source(self._face, self._face_key)
+        return self._face
+
+
+@stage_cache.memoised("import_outline", outline_params, disk=True)
+def _import_outline(cfg, svg_hash, path):
+    """import_svg_as_face, memoised on the hash of the file's contents."""
+    return import_svg_as_face(cfg, path)
+
+
+def _init_worker(build_cache, time_limit, parallel_booleans):
+    """Give worker processes the same build cache, time limit and boolean
+    mode as the parent, in case they weren't forked from it."""
+    global boolean_parallel
+    stage_cache.use_build_cache(build_cache)
+    set_time_limit(time_limit)
+    boolean_parallel = parallel_booleans
+
+
+def _generate_part_in_worker(cfg, part, outline, build_cache, profile):
+    """Generate a part, also returning the profiling report (as a dict) if
+    profiling, so it can be merged into the parent process's report."""
+    if not profile:
+        return _generate_part(cfg, part, outline, build_cache), None
+    with profiling.profile() as report:
+        meshes = _generate_part(cfg, part, outline, build_cache)
+    return meshes, report.to_dict()
+
+
+# Keys of the parts exported by this process, by their first output file.
+_exported = {}
+# Params read only when exporting.
+export_params = (
+    "output_dir",
+    "output_filetype",
+    "split",
+    "mesh_tolerance",
+    "mesh_angular_tolerance",
+)
+part_params = {
+    "case": case_params,
+    "carrycase": carrycase_params,
+    "tenting_flaps": tenting_flap_params,
+}
+
 
+def _generate_part(cfg, part, outline, build_cache=None, skip_unchanged=False):
+    """Build (or load from the cache) and export one independent part, along
+    with its mirrored copies. When exporting to .3mf, the parts' meshes are
+    returned to be bundled into one file instead."""
     pcb_case_wall_height = cfg["z_space_under_pcb"] + cfg["wall_z_height"]
 
-    base_face = import_svg_as_face(svg_file)
+    def cached(params, build):
+        """Load the list of shapes for this part from the cache, or build and
+        store them."""
+        if not build_cache:
+            return build()
+        key = build_cache.key(
+            part,
+            outline.hash,
+            {"test_print": test_print, **{k: cfg[k] for k in params}},
+        )
+        shapes = build_cache.load(key)
+        if shapes is not None:
+            print(f"Loaded {part} from cache")
+            profiling.count("build cache hits")
+            return shapes
+        profiling.count("build cache misses")
+        fallbacks = stage_cache.fallback_count()
+        shapes = build()
+        if stage_cache.fallback_count() == fallbacks:
+            build_cache.store(key, shapes)
+        return shapes
 
     def output_path(shape):
-        p = Path(cfg["output_dir"] / svg_file.stem / shape).with_suffix(
+        p = Path(cfg["output_dir"] / outline.svg_file.stem / shape).with_suffix(
             cfg["output_filetype"]
         )
         p.parent.mkdir(parents=True, exist_ok=True)
         return str(p)
 
-    print("Generating PCB case...")
-    case = generate_pcb_case(base_face, pcb_case_wall_height)
-    case_output = output_path("case")
-    _export(case, case_output, "PCB case")
+    first_output = Path(
+        output_path("tenting_flap_1" if part == "tenting_flaps" else part)
+    )
+    export_key = cache_key(
+        part,
+        outline.hash,
+        {k: cfg[k] for k in (*part_params[part], *export_params)},
+    )
+    if (
+        skip_unchanged
+        and cfg["output_filetype"] != ".3mf"
+        and _exported.get(first_output) == export_key
+        and first_output.exists()
+    ):
+        print(f"Skipping {part}, unchanged since it was last exported")
+        return []
+
+    meshes = []
+    with stage(part):
+        if part == "case":
+            print("Generating PCB case...")
+            (case,) = cached(
+                case_params,
+                lambda: [generate_pcb_case(cfg, outline.face(), pcb_case_wall_height)],
+            )
+            mirrored_output = None
+            if cfg["split"] and not test_print:
+                mirrored_output = output_path("case_mirrored")
+            _export(cfg, case, output_path("case"), "PCB case", mirrored_output, meshes)
+
+        elif part == "carrycase":
+            print("Generating carrycase...")
+            (carry,) = cached(
+                carrycase_params,
+                lambda: [generate_carrycase(cfg, outline.face(), pcb_case_wall_height)],
+            )
 
-    if cfg["split"] and not test_print:
-        case_output = output_path("case_mirrored")
-        _export(
-            mirror(case, about=Plane.YZ), case_output, "mirrored half of the PCB case"
-        )
+            case_output = output_path("carrycase")
+            _export(cfg, carry, case_output, "carry case", meshes=meshes)
 
-    if cfg["carrycase"]:
-        print("Generating carrycase...")
-        carry = generate_carrycase(base_face, pcb_case_wall_height)
+        elif part == "tenting_flaps":
+            print("Generating tenting legs...")
+            try:
+                from tenting_stand import tenting_stand_builder
+            except ImportError:
+                from .tenting_stand import tenting_stand_builder
+
+            wall_height = pcb_case_wall_height + cfg["base_z_thickness"]
+            flaps = cached(
+                tenting_flap_params,
+                lambda: tenting_stand_builder(cfg).tenting_legs(
+                    cfg["tent_legs"],
+                    _calc_case_len(cfg, outline.face()),
+                    cfg["tent_hinge_bolt_d"],
+                    wall_height,
+                ),
+            )
+            for i, flap in enumerate(flaps):
+                _export(
+                    cfg,
+                    flap,
+                    output_path(f"tenting_flap_{i+1}"),
+                    f"tenting flap {i+1}",
+                    output_path(f"tenting_flap_mirrored_{i+1}"),
+                    meshes,
+                )
+
+    _exported[first_output] = export_key
+    return meshes
+
+
+@stage_cache.memoised("case_body", case_body_params, disk=True)
+def _case_body(cfg, base_face, pcb_case_wall_height):
+    """The chamfered walls and base of the case, before anything is cut out of
+    them. The walls are memoised separately, so changing the honeycomb only
+    rebuilds the base."""
+    wall = _case_walls(cfg, base_face, pcb_case_wall_height)
+    base = extrude(base_face, cfg["base_z_thickness"])
 
-        case_output = output_path("carrycase")
-        _export(carry, case_output, "carry case")
+    if cfg["honeycomb_base"]:
+        # Create honeycomb by cutting it out of the top face of the base, then
+        # extruding that back down.
+        lattice = _create_honeycomb_lattice(cfg, base.faces().sort_by(Axis.Z).last)
+        base = extrude(lattice, -cfg["base_z_thickness"])
 
-    if cfg["tenting_stand"]:
-        print("Generating tenting legs...")
-        try:
-            from tenting_stand import _calc_leg_open_angle, tenting_legs
-        except ImportError:
-            from .tenting_stand import _calc_leg_open_angle, tenting_legs
+    return wall + base
 
 
-        wall_height = pcb_case_wall_height + cfg["base_z_thickness"]
-        case_len = _calc_case_len(base_face)
-        flaps = tenting_legs(
-            cfg["tent_legs"], case_len, cfg["tent_hinge_bolt_d"], wall_height
-        )
-        for i, flap in enumerate(flaps):
-            output = output_path(f"tenting_flap_{i+1}")
-            _export(flap, output, f"tenting flap {i+1}")
-            output = output_path(f"tenting_flap_mirrored_{i+1}")
-            _export(
-                mirror(flap, about=Plane.YZ), output, f"mirrored tenting flap {i+1}"
-            )
+@stage_cache.memoised("case_walls", case_walls_params, disk=True)
+def _case_walls(cfg, base_face, pcb_case_wall_height):
+    """The walls of the case around the base, chamfered at the top and bottom.
+    The bottom chamfer is within the walls, so is the same as chamfering the
+    whole case."""
+    base = extrude(base_face, cfg["base_z_thickness"])
 
-    return
+    wall_outer = _offset_outline(base_face, cfg["wall_xy_thickness"])
 
+    inner_cutout = _friction_fit_cutout(cfg, base_face).moved(
+        Loc((0, 0, cfg["base_z_thickness"]))
+    )
+    # show_object(inner_cutout, name="inner")
+    with stage("walls") as s:
+        wall = extrude(wall_outer, pcb_case_wall_height + cfg["base_z_thickness"])
+        wall -= inner_cutout
+        s.result = wall
+    wall = _poor_mans_chamfer(cfg, wall, cfg["chamfer_len"], top=True)
+    wall -= base
+    return _poor_mans_chamfer(cfg, wall, cfg["chamfer_len"])
 
-def _do_wall_cutouts(case, pcb_case_wall_height):
+
+@stage_cache.memoised("wall_cutouts", wall_cutout_params, disk=True)
+@profiled("wall_cutouts")
+def _do_wall_cutouts(cfg, case, pcb_case_wall_height):
     topf = case.faces().sort_by(sort_by=Axis.Z).last
     top_inner_wire = topf.wires().sort_by(SortBy.LENGTH)[0]
 
     to_do = [[cfg["cutout_position"], cfg["cutout_width"]], *cfg["additional_cutouts"]]
+    cutout_boxes = []
     for angle, width in to_do:
         location, rotation, _ = _wire_location_at_angle(top_inner_wire, angle)
         cutout_box = _finger_cutout(
+            cfg,
             location,
             rotation,
             cfg["wall_xy_thickness"],
             width,
             pcb_case_wall_height,
         )
-        case -= cutout_box
+        cutout_boxes.append(cutout_box)
 
-    return case
+    return _boolean(cfg, case, cutout_boxes)
 
 
-@cache
-def generate_pcb_case(base_face, pcb_case_wall_height):
-    base = extrude(base_face, cfg["base_z_thickness"])
+@stage_cache.memoised("case", case_params)
+def generate_pcb_case(cfg, base_face, pcb_case_wall_height):
     total_wall_height = (
         cfg["z_space_under_pcb"] + cfg["wall_z_height"] + cfg["base_z_thickness"]
     )
+    case = _case_body(cfg, base_face, pcb_case_wall_height)
+    case = _do_wall_cutouts(cfg, case, pcb_case_wall_height)
 
-    wall_outer = offset(
-        base_face,
-        cfg["wall_xy_thickness"],
-    )
-
-    inner_cutout = _friction_fit_cutout(
-        base_face.face().move(Loc((0, 0, cfg["base_z_thickness"])))
-    )
-    # show_object(inner_cutout, name="inner")
-    wall = extrude(wall_outer, pcb_case_wall_height + cfg["base_z_thickness"])
-
-    wall -= inner_cutout
-    wall = _poor_mans_chamfer(wall, cfg["chamfer_len"], top=True)
-    wall -= base
-
-    if cfg["honeycomb_base"]:
-        # Create honeycomb by subtracting it from the top face of the base.
-        hc = _create_honeycomb_tile(
-            cfg["base_z_thickness"], base.faces().sort_by(Axis.Z).last
-        )
-        base -= hc
-
-    case = wall + base
-
-    case = _poor_mans_chamfer(case, cfg["chamfer_len"])
-
-    case = _do_wall_cutouts(case, pcb_case_wall_height)
-
+    cutouts = []
+    additions = []
     if cfg["carrycase"]:
         if cfg["flush_carrycase_lip"]:
             # Cut out a lip for the carrycase
-            case -= _lip(base_face)
+            cutouts.append(_lip(cfg, base_face))
         # Cut out magnet holes
-        case -= _magnet_cutout(base_face, cfg["magnet_position"])
+        cutouts.append(_magnet_cutout(cfg, base_face, cfg["magnet_position"]))
+    case = _boolean(cfg, case, cutouts)
 
     if cfg["strap_loop"]:
         strap_loop = _strap_loop(
+            cfg,
             base_face,
             pcb_case_wall_height + cfg["base_z_thickness"] - cfg["chamfer_len"] * 2,
         ).moved(Loc((0, 0, cfg["chamfer_len"])))
@@ -236,11 +677,15 @@ def generate_pcb_case(base_face, pcb_case_wall_height):
         strap_loop = chamfer(
             edges, min(1.5, cfg["chamfer_len"], cfg["strap_loop_thickness"] / 2)
         )
-        case += strap_loop
+        additions.append(strap_loop)
+
+    if cfg["tenting_stand"]:
+        additions.append(_tent_hinge(cfg, base_face, total_wall_height))
+    case = _boolean(cfg, case, additions, fuse=True)
 
     if cfg["tenting_stand"]:
-        case += _tent_hinge(base_face, total_wall_height)
         case = _cutout_tenting_flaps(
+            cfg,
             case,
             base_face,
             total_wall_height,
@@ -253,11 +698,76 @@ def generate_pcb_case(base_face, pcb_case_wall_height):
     return case
 
 
-def generate_carrycase(base_face, pcb_case_wall_height):
+@stage_cache.memoised("carrycase", carrycase_params)
+def generate_carrycase(cfg, base_face, pcb_case_wall_height):
+    z_space_for_case = (
+        cfg["base_z_thickness"] + pcb_case_wall_height + cfg["carrycase_tolerance_z"]
+    )
+    case = _carrycase_body(cfg, base_face, pcb_case_wall_height)
+    case = _carrycase_finger_cutout(cfg, case, z_space_for_case)
+
+    cutouts = []
+    if cfg["strap_loop"]:
+        strap_loop = (
+            _strap_loop(
+                cfg,
+                # Not using real height because we're cutting out a specific
+                # amount.
+                base_face,
+                0.1,
+            )
+            .faces()
+            .sort_by(sort_by=Axis.Z)
+            .first
+        )
+        cutout_face = offset(
+            make_hull(strap_loop.edges()), cfg["carrycase_tolerance_xy"]
+        ).face()
+        cutouts.append(extrude(cutout_face, z_space_for_case))
+
+    if cfg["tenting_stand"]:
+        with stage("tenting_cutouts"):
+            # Cut out case hinge
+            cutout_face = _flatten_to_faces(
+                _tent_hinge(cfg, base_face, pcb_case_wall_height + cfg["base_z_thickness"])
+            )
+            cutout_face = offset(cutout_face, cfg["carrycase_tolerance_xy"]).face()
+            cutouts.append(extrude(cutout_face, z_space_for_case))
+            # Cut out leg hinges
+            cutout_face = _get_tenting_flap_shadow(
+                cfg,
+                base_face, pcb_case_wall_height + cfg["base_z_thickness"]
+            )
+            cutout_face = offset(cutout_face, tent_leg_cutout_tolerance).face()
+            cutouts.append(extrude(cutout_face, z_space_for_case))
+    case = _boolean(cfg, case, cutouts)
+
+    # Add lip to hold board in. Do after chamfer or chamfer breaks. If not
+    # flush, changes the top face so do after finger cutout.
+    case += _lip(cfg, base_face, carrycase=True)
+
+    case -= _magnet_cutout(cfg, base_face, cfg["magnet_position"], carrycase=True)
+
+    if test_print:
+        case -= slice
+
+    # Mirror on top face to create both sides
+    topf = case.faces().sort_by(sort_by=Axis.Z).last
+    if not test_print:
+        with stage("mirror") as s:
+            case += mirror(case, about=Plane(topf))
+            s.result = case
+    show_object(case, name="carry case", options={"color": (0, 0, 255)})
+    return case
+
+
+@stage_cache.memoised("carrycase_body", carrycase_body_params, disk=True)
+def _carrycase_body(cfg, base_face, pcb_case_wall_height):
+    """The chamfered walls and blocker of one half of the carrycase."""
     z_space_for_case = (
         cfg["base_z_thickness"] + pcb_case_wall_height + cfg["carrycase_tolerance_z"]
     )
-    cutout_outline = offset(
+    cutout_outline = _offset_outline(
         base_face, cfg["wall_xy_thickness"] + cfg["carrycase_tolerance_xy"]
     )
     wall_outline = offset(cutout_outline, cfg["carrycase_wall_xy_thickness"])
@@ -268,22 +778,29 @@ def generate_carrycase(base_face, pcb_case_wall_height):
         + pcb_case_wall_height
         + cfg["carrycase_z_gap_between_cases"] / 2
     )
-    wall = extrude(wall_outline, wall_height)
+    with stage("walls") as s:
+        wall = extrude(wall_outline, wall_height)
+        s.result = wall
     # cutout = extrude(cutout_outline, wall_height)
 
-    blocker = _carrycase_blocker(base_face, z_space_for_case)
+    blocker = _carrycase_blocker(cfg, base_face, z_space_for_case)
     case = wall + blocker
 
     # Have to chamfer before cutout because cutout breaks the face
-    case = _poor_mans_chamfer(case, cfg["chamfer_len"])
+    return _poor_mans_chamfer(cfg, case, cfg["chamfer_len"])
 
-    # Create finger cutout for removing boards
+
+@stage_cache.memoised("finger_cutout", carrycase_cutout_params)
+@profiled("finger_cutout")
+def _carrycase_finger_cutout(cfg, case, z_space_for_case):
+    """Cut out the finger cutout for removing boards from the carrycase."""
     botf = case.faces().sort_by(sort_by=Axis.Z).first
     bottom_inner_wire = botf.wires()[0]
     location, rotation, location_percent = _wire_location_at_angle(
         bottom_inner_wire, cfg["carrycase_cutout_position"]
     )
     cutout_box = _finger_cutout(
+        cfg,
         location,
         rotation,
         cfg["carrycase_wall_xy_thickness"],
@@ -297,56 +814,11 @@ def generate_carrycase(base_face, pcb_case_wall_height):
     # show_object(cutout_box, name="carry case cutout box")
 
     case -= cutout_box
-
-    if cfg["strap_loop"]:
-        strap_loop = (
-            _strap_loop(
-                # Not using real height because we're cutting out a specific
-                # amount.
-                base_face,
-                0.1,
-            )
-            .faces()
-            .sort_by(sort_by=Axis.Z)
-            .first
-        )
-        cutout_face = offset(
-            make_hull(strap_loop.edges()), cfg["carrycase_tolerance_xy"]
-        ).face()
-        case -= extrude(cutout_face, z_space_for_case)
-
-    if cfg["tenting_stand"]:
-        # Cut out case hinge
-        cutout_face = _flatten_to_faces(
-            _tent_hinge(base_face, pcb_case_wall_height + cfg["base_z_thickness"])
-        )
-        cutout_face = offset(cutout_face, cfg["carrycase_tolerance_xy"]).face()
-        case -= extrude(cutout_face, z_space_for_case)
-        # Cut out leg hinges
-        cutout_face = _get_tenting_flap_shadow(
-            base_face, pcb_case_wall_height + cfg["base_z_thickness"]
-        )
-        cutout_face = offset(cutout_face, tent_leg_cutout_tolerance).face()
-        case -= extrude(cutout_face, z_space_for_case)
-
-    # Add lip to hold board in. Do after chamfer or chamfer breaks. If not
-    # flush, changes the top face so do after finger cutout.
-    case += _lip(base_face, carrycase=True)
-
-    case -= _magnet_cutout(base_face, cfg["magnet_position"], carrycase=True)
-
-    if test_print:
-        case -= slice
-
-    # Mirror on top face to create both sides
-    topf = case.faces().sort_by(sort_by=Axis.Z).last
-    if not test_print:
-        case += mirror(case, about=Plane(topf))
-    show_object(case, name="carry case", options={"color": (0, 0, 255)})
     return case
 
 
-def _carrycase_blocker(base_face, z_space_for_case):
+@profiled("carrycase_blocker")
+def _carrycase_blocker(cfg, base_face, z_space_for_case):
     """
     Part that blocks the pcb case from going all the way through.
     Blocker is made of 3 parts:
@@ -356,7 +828,7 @@ def _carrycase_blocker(base_face, z_space_for_case):
     to the carrycase wall, to create a printable overhang,
     3. a subtracted layer extruded blocker_thickness from base_face.
     """
-    carrycase_inner_face = offset(
+    carrycase_inner_face = _offset_outline(
         base_face, cfg["wall_xy_thickness"] + cfg["carrycase_tolerance_xy"]
     ).face()
     # Half the wall thickness. Don't want too close to the keyboard because as
@@ -383,9 +855,12 @@ def _carrycase_blocker(base_face, z_space_for_case):
     return blocker
 
 
-def _friction_fit_cutout(base_face):
+@stage_cache.memoised("friction_fit_cutout", friction_fit_params, disk=True)
+@profiled("friction_fit_cutout")
+def _friction_fit_cutout(cfg, base_face):
     """Create a shape representing the inner case space, within the walls, to
-    be cut out of the overall base shape.
+    be cut out of the overall base shape. It starts at the height of
+    base_face, so is moved up onto the base by the caller.
 
     b123d engine has bizare problems with tapers on tiny -ve offsets from the
     face, which we need for the bottom tolerance.
@@ -424,11 +899,31 @@ def _friction_fit_cutout(base_face):
     # # should start (unknown), and one where the pcb starts (wall_xy_bottom_tolerance).
     case_bottom_offset = T * cfg["z_space_under_pcb"]
     bottom_offset = -case_bottom_offset + cfg["wall_xy_bottom_tolerance"]
-    bottom_face = offset(base_face, bottom_offset).face()
+    bottom_face = _offset_outline(base_face, bottom_offset).face()
     # bottom_face = _fix_face_edges(bottom_face)
     try:
-        case_inner_cutout = extrude(bottom_face, amount=total_wall_height, taper=-taper)
-    except (OCP.StdFail.StdFail_NotDone, ValueError):
+        try:
+            case_inner_cutout = with_timeout(
+                extrude,
+                bottom_face,
+                amount=total_wall_height,
+                taper=-taper,
+            )
+        except OperationTimeout as e:
+            simplified_face = _simplify_face(bottom_face, draft_outline_tolerance)
+            if simplified_face is bottom_face:
+                # Retrying with the same outline would only time out again.
+                raise OperationTimeout(
+                    f"{e}, and the outline can't be simplified to retry it (try raising operation_timeout)"
+                ) from None
+            _timed_out(e, "retrying the friction fit cutout with a simplified outline")
+            case_inner_cutout = with_timeout(
+                extrude,
+                simplified_face,
+                amount=total_wall_height,
+                taper=-taper,
+            )
+    except (OCP.StdFail.StdFail_NotDone, ValueError, OperationTimeout):
         print(
             "Error: This SVG outline has too many small edges to do a friction fit cutout. Try reducing the top and bottom tolerances, reducing the wall height, or simplyfing the input SVG paths."
         )
@@ -457,9 +952,7 @@ def _safe_offset2d(face: Face, offset: float):
     return new_face
 
 
-def _finger_cutout(location, rotation, thickness, width, height):
-    if fast_render:
-        return Part()
+def _finger_cutout(cfg, location, rotation, thickness, width, height):
     # Mutliplying x and y by ~2 because we're centering it on those axis, but
     # only cutting out of one side.
     # Centering because sometimes depending on the wire we get the location
@@ -470,23 +963,24 @@ def _finger_cutout(location, rotation, thickness, width, height):
         thickness * 2.1,
         height * 2,
     )
-    # Smooth the sides of the cutout
-    cutout_box = fillet(
-        cutout_box.edges().filter_by(Axis.Y), min(height / 2.1, width / 2.1)
-    )
-    # Smooth the wide sides too, just in case this is cutting out a corner (e.g. for ferris)
-    cutout_box = fillet(
-        cutout_box.edges().filter_by(Axis.X), min(height / 2.1, thickness / 2.1)
-    )
+    if cfg["preview"] != "draft":
+        # Smooth the sides of the cutout
+        cutout_box = fillet(
+            cutout_box.edges().filter_by(Axis.Y), min(height / 2.1, width / 2.1)
+        )
+        # Smooth the wide sides too, just in case this is cutting out a corner (e.g. for ferris)
+        cutout_box = fillet(
+            cutout_box.edges().filter_by(Axis.X), min(height / 2.1, thickness / 2.1)
+        )
 
     cutout_box = cutout_box.rotate(Axis.Z, rotation)
     cutout_box.position = location.position
     return cutout_box
 
 
-def _magnet_cutout(main_face, angle, carrycase=False):
-    if fast_render:
-        return Part()
+@stage_cache.memoised("magnets", magnet_stage_params)
+@profiled("magnets")
+def _magnet_cutout(cfg, main_face, angle, carrycase=False):
     assert (
         cfg["wall_xy_thickness"] - cfg["magnet_separation_distance"] >= magnet_height
     ), "Your wall thickness is too small for the magnets to fit."
@@ -521,23 +1015,19 @@ def _magnet_cutout(main_face, angle, carrycase=False):
     # Get second largest face parallel to XY plane - i.e., the inner case face
     # inner_case_face = sorted(case.faces().filter_by(Plane.XY), key=lambda x: x.area)[-2]
     inner_wire = main_face.wire()
-    _, _, center_percent = _wire_location_at_angle(
-        inner_wire, angle, origin=main_face.center()
-    )
-    center_at_mm = center_percent * inner_wire.length
+    query = _outline_query(inner_wire)
+    _, _, center_percent = query.at_angle(angle, origin=main_face.center())
+    center_at_mm = center_percent * query.length
     span = (cfg["magnet_count"] - 1) * cfg["magnet_spacing"]
     start = center_at_mm - span / 2
+    positions = start + cfg["magnet_spacing"] * np.arange(cfg["magnet_count"])
+    locations, rotations = query.at_lengths(positions)
 
     cutouts = []
-    position = start
-    for _ in range(cfg["magnet_count"]):
+    for location, rotation in zip(locations, rotations):
         cutout = copy.copy(template)
-        location = inner_wire.location_at(position, position_mode=PositionMode.LENGTH)
         # Rotation on wire can be tricky to get right, and may flip depending on the location on the wire.
         # All we know is that the wire's Z orientation is the wire tangent.
-        rotation = inner_wire.tangent_angle_at(
-            position, position_mode=PositionMode.LENGTH
-        )
         # If the wire has flipped,
         # towards_center = Axis(origin=main_face.center(), edge=Line(main_face.center(), location.position).edge())
 
@@ -547,13 +1037,14 @@ def _magnet_cutout(main_face, angle, carrycase=False):
         cutout.position += (0, 0, magnet_radius_y + cfg["base_z_thickness"] + 0.01)
         cutouts.append(cutout)
         # show_object(cutout, f"magnet_cutout_{position}")
-        position += cfg["magnet_spacing"]
 
     # show_object(cutouts, name=f"magnet_cutouts_{carrycase}", options={"alpha": 0.8})
     return cutouts
 
 
-def _lip(base_face, carrycase=False):
+@stage_cache.memoised("lip", lip_stage_params)
+@profiled("lip")
+def _lip(cfg, base_face, carrycase=False):
     # Use same z len as total lip xy len so that chamfer is complete.
     lip_xy_len = cfg["lip_len"]
     lip_z_len = cfg["lip_len"] + cfg["carrycase_tolerance_xy"]
@@ -563,7 +1054,7 @@ def _lip(base_face, carrycase=False):
         lip_xy_len += 0.3
         lip_z_len += 0.3
     # Inner face of carrycase
-    inner_face = offset(
+    inner_face = _offset_outline(
         base_face, cfg["wall_xy_thickness"] + cfg["carrycase_tolerance_xy"]
     )
     # Outer is the full carrycase outer face
@@ -573,8 +1064,8 @@ def _lip(base_face, carrycase=False):
         # minus chamfer to avoid interfering/drawing over it.
         - cfg["chamfer_len"],
     )
-    case_outer_face = offset(base_face, cfg["wall_xy_thickness"])
-    cutout_face = offset(base_face, cfg["wall_xy_thickness"] - lip_xy_len)
+    case_outer_face = _offset_outline(base_face, cfg["wall_xy_thickness"])
+    cutout_face = _offset_outline(base_face, cfg["wall_xy_thickness"] - lip_xy_len)
     # # Offsetting on wires rather than faces seems to help fix OCP edge issues
     # cutout_face = make_face(offset(base_face.face().outer_wire(), cfg["wall_xy_thickness"] - lip_xy_len))
     lip = outer_face - cutout_face
@@ -593,18 +1084,26 @@ def _lip(base_face, carrycase=False):
 
     lip = extrude(lip.face(), lip_z_len)
 
-    if cfg["flush_carrycase_lip"]:
+    if cfg["flush_carrycase_lip"] and cfg["preview"] != "draft":
         # Poor man's chamfer of inner edge of lip
         # No point doing it with non-flush lip, because it would reduce the
         # catching surface.
-        try:
+        def chamfer_lip():
             # cutout_face = _fix_face_edges(cutout_face.face())
             chamfer_cutout = extrude(cutout_face, lip_z_len, taper=-45)
-            lip -= chamfer_cutout
+            return lip - chamfer_cutout
+
+        try:
+            lip = with_timeout(chamfer_lip)
         except OCP.StdFail.StdFail_NotDone:
             print(
                 "Warning: Failed to chamfer carrycase lip; cutout will need supports and a higher tolerance"
             )
+        except OperationTimeout as e:
+            _timed_out(
+                e,
+                "leaving the carrycase lip unchamfered, so the cutout will need supports and a higher tolerance",
+            )
     else:
         lip.move(Loc((0, 0, -lip_z_len)))
 
@@ -612,9 +1111,10 @@ def _lip(base_face, carrycase=False):
     return lip
 
 
-def _strap_loop(base_face, case_height):
+@profiled("strap_loop")
+def _strap_loop(cfg, base_face, case_height):
     """Create a loop for attaching a strap to the left side of the case."""
-    outer_face = offset(base_face, cfg["wall_xy_thickness"])
+    outer_face = _offset_outline(base_face, cfg["wall_xy_thickness"])
     # Find the leftmost edge of the case
     bb = outer_face.bounding_box()
     end_range_size = 0.1
@@ -644,30 +1144,96 @@ def _strap_loop(base_face, case_height):
     return strap_loop
 
 
-def _create_honeycomb_tile(depth, face):
-    if fast_render:
-        return Part()
+@profiled("honeycomb")
+def _create_honeycomb_lattice(cfg, face):
+    """Cut the honeycomb holes out of face, returning a single lattice face.
+    The pattern is laid out in 2D, and cells that would lie entirely outside
+    face are dropped before the cut, so only one 2D boolean is needed. Only
+    done for final builds."""
+    if cfg["preview"] != "final":
+        return face
     radius = cfg["honeycomb_radius"]
     cell_thickness = cfg["honeycomb_thickness"]
     d_between_centers = radius + cell_thickness
     area = face.bounding_box()
     n_hexes = [round(size / d_between_centers) for size in (area.size.X, area.size.Y)]
     locs = HexLocations(d_between_centers, *n_hexes, major_radius=True).local_locations
+    locs = [Plane(face).location * loc for loc in locs]
+    centers = np.array([(loc.position.X, loc.position.Y) for loc in locs])
+
+    # Cells whose centre is further than the radius from every edge lie
+    # entirely inside or outside the face, and the outside ones can be skipped.
+    segments = np.concatenate(
+        [_polyline_segments(_wire_polyline(w)) for w in face.wires()]
+    )
+    inside = _points_in_polygon(centers, segments)
+    clear = _distance_to_segments(centers, segments) > radius + polyline_deflection
+
     h = RegularPolygon(radius, 6)
-    h = extrude(h, -depth)
-    hs = Plane(face) * locs * h
-    return hs
+    cells = [loc * h for loc, i, c in zip(locs, inside, clear) if i or not c]
+    if not cells:
+        return face
+    lattice = face - Sketch(Compound(cells).wrapped)
+    return lattice
+
 
+# Max distance between a wire and the polyline approximating it.
+polyline_deflection = 0.01
 
-def _tent_hinge(base_face, wall_height):
+
+def _wire_polyline(wire, deflection=polyline_deflection):
+    """Discretise a wire into an (n, 2) array of XY points along it, within
+    deflection of the true wire. Closed wires repeat the first point at the
+    end."""
+    sampler = GCPnts_QuasiUniformDeflection(
+        BRepAdaptor_CompCurve(wire.wrapped), deflection
+    )
+    points = (sampler.Value(i) for i in range(1, sampler.NbPoints() + 1))
+    return np.array([(p.X(), p.Y()) for p in points])
+
+
+def _polyline_segments(polyline):
+    """(n, 2, 2) array of the start and end points of each polyline segment."""
+    return np.stack([polyline[:-1], polyline[1:]], axis=1)
+
+
+def _points_in_polygon(points, segments):
+    """Even-odd test of which of the (n, 2) points are inside the closed
+    polygon(s) made of segments."""
+    x, y = points[:, 0:1], points[:, 1:2]
+    (x1, y1), (x2, y2) = segments[:, 0].T, segments[:, 1].T
+    # Count crossings of a ray going in +X from each point.
+    straddles = (y1 > y) != (y2 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    crossings = straddles & (x < x_cross)
+    return crossings.sum(axis=1) % 2 == 1
+
+
+def _distance_to_segments(points, segments):
+    """Distance from each of the (n, 2) points to the nearest segment."""
+    start = segments[:, 0]
+    along = segments[:, 1] - start
+    length_sq = (along**2).sum(axis=1)
+    rel = points[:, None, :] - start[None, :, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.clip((rel * along).sum(axis=2) / length_sq, 0, 1)
+    t = np.nan_to_num(t)
+    nearest = start[None, :, :] + t[:, :, None] * along[None, :, :]
+    return np.sqrt(((points[:, None, :] - nearest) ** 2).sum(axis=2)).min(axis=1)
+
+
+@stage_cache.memoised("tent_hinge", tent_hinge_params)
+@profiled("tent_hinge")
+def _tent_hinge(cfg, base_face, wall_height):
     """Attach hinge for quick-tenting system to right side of case."""
     try:
-        from tenting_stand import case_hinge
+        from tenting_stand import tenting_stand_builder
     except ImportError:
-        from .tenting_stand import case_hinge
+        from .tenting_stand import tenting_stand_builder
 
-    hinge = case_hinge(wall_height, cfg["tent_hinge_bolt_d"], cfg["tent_hinge_bolt_l"])
-    reposition = _find_hinge_reposition(base_face, hinge)
+    hinge = tenting_stand_builder(cfg).case_hinge(wall_height, cfg["tent_hinge_bolt_d"])
+    reposition = _find_hinge_reposition(cfg, base_face, hinge)
     hinge = reposition * hinge
     # hinge = hinge.move(
     #     Loc((params["tent_hinge_position_adjustment"]))
@@ -675,11 +1241,11 @@ def _tent_hinge(base_face, wall_height):
     return hinge
 
 
-@cache
-def _find_hinge_reposition(base_face, hinge) -> None:
+@stage_cache.lru_cache_on_shapes(maxsize=32)
+def _find_hinge_reposition(cfg, base_face, hinge) -> None:
     """Find the Location to move the created hinge or flaps so that it
     perfectly mates with the rightmost side of the case."""
-    outer_face = offset(base_face, cfg["wall_xy_thickness"])
+    outer_face = _offset_outline(base_face, cfg["wall_xy_thickness"])
     # Find the leftmost edge of the case
     bb = outer_face.bounding_box()
     end_range_size = 1
@@ -702,80 +1268,54 @@ def _find_hinge_reposition(base_face, hinge) -> None:
     return reposition
 
 
-def _cutout_tenting_flaps(case, base_face, wall_height):
-    shadow = _get_tenting_flap_shadow(base_face, wall_height)
+@profiled("tenting_flap_cutout")
+def _cutout_tenting_flaps(cfg, case, base_face, wall_height):
+    shadow = _get_tenting_flap_shadow(cfg, base_face, wall_height)
     shadow = offset(shadow, tent_leg_cutout_tolerance)
-    outer_case_face = offset(base_face, cfg["wall_xy_thickness"]).face()
+    outer_case_face = _offset_outline(base_face, cfg["wall_xy_thickness"]).face()
     shadow_within_walls = shadow.intersect(outer_case_face).face()
     # Create plastic outline for flaps to fold into. Only really needed if
     # using honeycomb base, but may as well include it jic. Extra offset for inner cutout to give a bit of tolerance for the flap.
     flap_slot = offset(shadow_within_walls, cfg["wall_xy_thickness"]) - shadow
     flap_slot = extrude(flap_slot, cfg["base_z_thickness"])
-    case -= extrude(shadow, cfg["base_z_thickness"])
-    case += flap_slot
-    return case
+    case = _boolean(cfg, case, [extrude(shadow, cfg["base_z_thickness"])])
+    return _boolean(cfg, case, [flap_slot], fuse=True)
 
 
-@cache
-def _get_tenting_flap_shadow(base_face, wall_height):
-    # Import it after updating cnf, because it uses the cnf values on import.
+@stage_cache.memoised("tenting_flap_shadow", tenting_flap_shadow_params)
+@profiled("tenting_flap_shadow")
+def _get_tenting_flap_shadow(cfg, base_face, wall_height):
     try:
-        from tenting_stand import _calc_leg_open_angle, tenting_legs
+        from tenting_stand import tenting_stand_builder
     except ImportError:
-        from .tenting_stand import _calc_leg_open_angle, tenting_legs
-
-    case_len = _calc_case_len(base_face)
-    # Avoiding filleting the end is important until b123d fixes the bug
-    # preventing rounded faces from projecting to plane successfully. Once that
-    # is fixed, change project_to_face to not filter to those faces, and remove
-    # the fillet_end parameter from this call chain.
-    flaps = tenting_legs(
+        from .tenting_stand import tenting_stand_builder
+
+    footprints = tenting_stand_builder(cfg).flap_footprints(
         cfg["tent_legs"],
-        case_len,
+        _calc_case_len(cfg, base_face),
         cfg["tent_hinge_bolt_d"],
         wall_height,
-        fillet_end=False,
     )
-
     # Reposition to same place as hinge.
-    hinge = _tent_hinge(base_face, wall_height)
-    for i, f in enumerate(flaps):
-        # Show full generated flaps in rotated/open position, to check blockers
-        # and for showcase images.
-        show_object(
-            flaps[i]
-            .rotate(
-                Axis.Y,
-                -_calc_leg_open_angle(
-                    _calc_case_len(base_face), f.bounding_box().size.X - wall_height
-                ),
-            )
-            .move(hinge.location),
-            name=f"flap_open_{i}",
-            options={"color": (255 - 20 * i, 40 * i, 40 * i)},
-        )
-        flaps[i] = f.move(hinge.location)
-        show_object(
-            flaps[i],
-            name=f"flap_closed_{i}",
-            options={"color": (255 - 20 * i, 40 * i, 40 * i)},
-        )
-
-    shadow = _flatten_to_faces(flaps)
+    position = _tent_hinge(cfg, base_face, wall_height).location.position
+    shadow = Sketch() + [f.moved(Loc((position.X, position.Y))) for f in footprints]
     # Ensure we get the outline of the largest face, otherwise might get inversion from little ridge face.
     shadow = make_face(shadow.faces().sort_by(SortBy.AREA).last.outer_wire()).face()
     return shadow
 
 
-def _calc_case_len(base_face):
-    case_len = offset(base_face, cfg["wall_xy_thickness"]).bounding_box().size.X
+def _calc_case_len(cfg, base_face):
+    case_len = _offset_outline(base_face, cfg["wall_xy_thickness"]).bounding_box().size.X
     if cfg["strap_loop"]:
         case_len += cfg["strap_loop_thickness"] + cfg["strap_loop_gap"]
     return case_len
 
 
-def _poor_mans_chamfer(shape, size, top=False):
+@profiled("chamfer")
+def _poor_mans_chamfer(cfg, shape, size, top=False):
     """Chamfers the bottom or top outer edge of a shape by subtracting a tapered extrusion"""
+    if cfg["preview"] == "draft":
+        return shape
     faces = shape.faces().sort_by(sort_by=Axis.Z)
     if top:
         face = faces.last
@@ -788,34 +1328,126 @@ def _poor_mans_chamfer(shape, size, top=False):
         face = face
     outer = extrude(face, size)
     inner_f = offset(face, -size).face()
-    try:
+
+    def chamfer():
         inner = extrude(inner_f, size, taper=-44)
+        cutout = outer - inner
+        return shape - cutout
+
+    try:
+        out = with_timeout(chamfer)
+    except OperationTimeout as e:
+        _timed_out(e, "skipping the chamfer")
+        return shape
     except (OCP.StdFail.StdFail_NotDone, ValueError):
         print(
             "Error: This SVG outline has too many small edges to chamfer the top and bottom. Skipping"
         )
         return shape
-    cutout = outer - inner
-    out = shape - cutout
     # show_object(inner_f, name="inner_f")
     # show_object(outer, name="outer")
     # show_object(inner, name="inner")
     return out
 
 
-def _export(shape, path, name):
+def _boolean(cfg, shape, tools, fuse=False):
+    """shape with all of tools cut out of it (or added to it if fuse) in one
+    boolean, rather than one boolean per tool that each has to intersect the
+    growing shape again."""
+    # Tools may be lists of shapes, as with the - and + operators.
+    tools = [
+        t
+        for tool in tools
+        for shape_or_list in (tool if isinstance(tool, (list, tuple)) else [tool])
+        for t in (
+            shape_or_list.first_level_shapes()
+            if isinstance(shape_or_list, Compound)
+            else [shape_or_list]
+        )
+    ]
+    if not tools:
+        return shape
+    arguments = TopTools_ListOfShape()
+    arguments.Append(shape.wrapped)
+    tool_list = TopTools_ListOfShape()
+    for tool in tools:
+        tool_list.Append(tool.wrapped)
+    operation = BRepAlgoAPI_Fuse() if fuse else BRepAlgoAPI_Cut()
+    operation.SetArguments(arguments)
+    operation.SetTools(tool_list)
+    operation.SetRunParallel(boolean_parallel)
+    operation.SetFuzzyValue(cfg["boolean_fuzzy"])
+    operation.Build()
+    if not operation.IsDone():
+        raise ValueError(f"{'Fusing' if fuse else 'Cutting'} {len(tools)} shapes failed")
+    result = shape.cast(operation.Shape())
+    # As the + and - operators do.
+    shape.copy_attributes_to(result, ["wrapped", "_NodeMixin__children"])
+    if isinstance(result, Compound):
+        result = result.unwrap(fully=True)
+    if fuse:
+        result = result.clean()
+    return result
+
+
+def _timed_out(timeout, fallback):
+    """Report that an operation timed out and a fallback was taken instead,
+    which makes the result depend on more than the params, so it isn't
+    cached."""
+    print(f"Warning: {timeout}; {fallback}")
+    profiling.event("timeout", operation=str(timeout), fallback=fallback)
+    stage_cache.took_fallback()
+
+
+def _export(cfg, shape, path, name, mirrored_path=None, meshes=None):
+    """Export shape to path, and its mirror image about the YZ plane to
+    mirrored_path if given. For .3mf, the mesh is appended to meshes to be
+    written later with mesh_export.write_3mf."""
     path = Path(path).expanduser()
     if test_print:
         git_head_hash = os.popen("git rev-parse HEAD").read().strip()[:6]
         path = path.with_stem(path.stem + "_test_" + git_head_hash)
-    print(f"Exporting {name} as {path}...")
-    pathstr = str(path)
-    if path.suffix == ".stl":
-        export_stl(shape, pathstr)
-    elif path.suffix == ".step":
-        export_step(shape, pathstr)
+    if mirrored_path is not None:
+        mirrored_path = Path(mirrored_path).expanduser()
+    if path.suffix == ".3mf":
+        print(f"Meshing {name}...")
     else:
-        print(f"Invalid export suffix: '{path.suffix}' Must be .stl or .step")
+        print(f"Exporting {name} as {path}...")
+        if mirrored_path is not None:
+            print(f"Exporting mirrored {name} as {mirrored_path}...")
+    pathstr = str(path)
+    with stage("export") as s:
+        s.result = shape
+        if path.suffix in (".stl", ".3mf"):
+            # Tessellate once, and mirror the mesh rather than the solid.
+            tolerance, angular_tolerance = (
+                cfg["mesh_tolerance"],
+                cfg["mesh_angular_tolerance"],
+            )
+            if cfg["preview"] in preview_mesh_tolerances:
+                min_tolerance, min_angular = preview_mesh_tolerances[cfg["preview"]]
+                tolerance = max(tolerance, min_tolerance)
+                angular_tolerance = max(angular_tolerance, min_angular)
+            vertices, triangles = mesh_export.tessellate(
+                shape, tolerance, angular_tolerance
+            )
+        if path.suffix == ".3mf":
+            mirrored_name = None if mirrored_path is None else mirrored_path.stem
+            meshes.append((path.stem, vertices, triangles, mirrored_name))
+        elif path.suffix == ".stl":
+            mesh_export.write_stl(pathstr, vertices, triangles)
+            if mirrored_path is not None:
+                mesh_export.write_stl(
+                    mirrored_path, *mesh_export.mirror_x(vertices, triangles)
+                )
+        elif path.suffix == ".step":
+            export_step(shape, pathstr)
+            if mirrored_path is not None:
+                export_step(mirror(shape, about=Plane.YZ), str(mirrored_path))
+        else:
+            print(
+                f"Invalid export suffix: '{path.suffix}' Must be .stl, .step or .3mf"
+            )
 
 
 def _flatten_to_faces(shape):
@@ -831,34 +1463,112 @@ def _flatten_to_faces(shape):
 
 def _wire_location_at_angle(wire, angle, origin=None):
     """Find the location of a wire at a certail polar angle from the given origin.polar location of a wire relative to a central origin."""
-    if not origin:
-        origin = wire.center(CenterOf.BOUNDING_BOX)
-    # Form a ray in the direction of angle. Has to be a face, because 1D objects currently won't intersect.
-    polar_length = wire.bounding_box().diagonal * 2
-    projection = PolarLine(origin, polar_length, angle)
-    # Ensure ray has thickness regardless of angle.
-    ray = make_face(SlotArc(projection, 1.1))
-    face = make_face(wire)
-    # Sometimes projection has a rotation, so the ray isn't coplanar with the face.
-    projected_ax = Axis(origin=origin, edge=projection.edge())
-    # Have to do this multiple times to ensure coplanar, for some reason. Floats, presumably.
-    while ray.face().normal_at().Z != 1:
-        ray_normal = Axis(origin=origin, direction=ray.face().normal_at())
-        angle_correction = ray_normal.angle_between(Axis.Z)
-        ray = ray.rotate(projected_ax, angle_correction)
-    # ensure it isn't upside down
-    if ray.face().normal_at().Z < 0.99:
-        ray = ray.rotate(projected_ax, 180)
-    sect = ray.intersect(face)
-    furthest_edge = sect.edges().sort_by(SortBy.DISTANCE)[-1]
-    location = furthest_edge ^ 0.5
-    tangent = furthest_edge.tangent_angle_at(0.5)
-    location_percent = wire.param_at_point(location.position)
-    return location, tangent, location_percent
-
+    return _outline_query(wire).at_angle(angle, origin)
+
+
+@stage_cache.lru_cache_on_shapes(maxsize=32)
+def _outline_query(wire):
+    return _OutlineQuery(wire)
+
+
+def _offset_outline(face, distance, kind=Kind.ARC):
+    """offset(face, distance, kind=kind), only computed once for each face,
+    distance and kind. The result is shared, so must not be modified in
+    place."""
+    return _outline_offsets(face).offset(distance, kind)
+
+
+@stage_cache.lru_cache_on_shapes(maxsize=32)
+def _outline_offsets(face):
+    return _OutlineOffsets(face)
+
+
+class _OutlineOffsets:
+    """Offsets of an outline face, memoised by distance and kind. The parts
+    offset the outline by the same few distances (e.g. to the outside of the
+    case wall) in many places."""
+
+    def __init__(self, face):
+        self.face = face
+        self._offsets = {}
+
+    def offset(self, distance, kind=Kind.ARC):
+        # Distances computed as different sums of the same params can differ
+        # by rounding error.
+        key = (round(distance, 9), kind)
+        if key in self._offsets:
+            profiling.count("offset cache hits")
+        else:
+            profiling.count("offset cache misses")
+            self._offsets[key] = offset(self.face, distance, kind=kind)
+        return self._offsets[key]
+
+
+class _OutlineQuery:
+    """Placement queries along a closed wire (location at a polar angle or
+    length along it), answered from a polyline sampled once when this is
+    created instead of intersecting shapes for every query. Lengths and
+    fractions are measured from the wire's start, in its direction."""
+
+    def __init__(self, wire):
+        self.length = wire.length
+        self.center = wire.center(CenterOf.BOUNDING_BOX)
+        # Outlines are flat, so every point is at the same height.
+        self.z = self.center.Z
+        self.points = _wire_polyline(wire)
+        self.segments = _polyline_segments(self.points)
+        seg_lengths = np.linalg.norm(self.points[1:] - self.points[:-1], axis=1)
+        self.cum_lengths = np.concatenate([[0], np.cumsum(seg_lengths)])
+        along = self.segments[:, 1] - self.segments[:, 0]
+        self.tangents = (np.degrees(np.arctan2(along[:, 1], along[:, 0])) + 360) % 360
+
+    def at_angle(self, angle, origin=None):
+        """Location of the outermost point where a ray from origin (by default,
+        the wire's bounding box center) at a polar angle crosses the wire.
+        Returns the location, the tangent angle of the wire there, and the
+        fraction of the wire's length it is along the wire."""
+        if origin is None:
+            origin = self.center
+        o = np.array([origin.X, origin.Y])
+        d = np.array([math.cos(math.radians(angle)), math.sin(math.radians(angle))])
+        start = self.segments[:, 0]
+        along = self.segments[:, 1] - start
+        rel = start - o
+        # Solve o + t*d = start + u*along for each segment.
+        denom = d[0] * along[:, 1] - d[1] * along[:, 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (rel[:, 0] * along[:, 1] - rel[:, 1] * along[:, 0]) / denom
+            u = (rel[:, 0] * d[1] - rel[:, 1] * d[0]) / denom
+        hits = (denom != 0) & (t >= 0) & (u >= 0) & (u <= 1)
+        if not hits.any():
+            raise ValueError(f"No point on the outline at angle {angle}")
+        i = np.flatnonzero(hits)[np.argmax(t[hits])]
+        point = o + t[i] * d
+        fraction = (
+            self.cum_lengths[i] + u[i] * (self.cum_lengths[i + 1] - self.cum_lengths[i])
+        ) / self.cum_lengths[-1]
+        location = Location((*point, self.z))
+        return location, float(self.tangents[i]), float(fraction)
+
+    def at_lengths(self, distances):
+        """Locations and tangent angles at each distance along the wire.
+        Distances wrap around the closed wire."""
+        # Scale from the wire's length to the polyline's.
+        d = np.asarray(distances) / self.length * self.cum_lengths[-1]
+        d = d % self.cum_lengths[-1]
+        i = np.clip(
+            np.searchsorted(self.cum_lengths, d, side="right") - 1,
+            0,
+            len(self.segments) - 1,
+        )
+        seg_len = self.cum_lengths[i + 1] - self.cum_lengths[i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            u = np.nan_to_num((d - self.cum_lengths[i]) / seg_len)
+        start = self.segments[i, 0]
+        points = start + u[:, None] * (self.segments[i, 1] - start)
+        locations = [Location((x, y, self.z)) for x, y in points]
+        return locations, self.tangents[i].tolist()
 
-if test_print:
-    cfg.update(test_overrides)
 
 # Code for debugging
 if __name__ in ["temp", "__cq_main__", "__main__"]:
@@ -874,17 +1584,16 @@ if __name__ in ["temp", "__cq_main__", "__main__"]:
     import json
 
     param_overrides = json.loads(config.read_text())
-    cfg = default_params
-    cfg.update(param_overrides)
+    cfg = Config(default_params).updated(param_overrides)
     if test_print:
-        cfg.update(test_overrides)
+        cfg = cfg.updated(test_overrides)
 
     pcb_case_wall_height = cfg["z_space_under_pcb"] + cfg["wall_z_height"]
 
-    base_face = import_svg_as_face(p)
+    base_face = import_svg_as_face(cfg, p)
     show_object(base_face, name="base_face")
     # bf = make_face(base_face).face()
     # show_object(bf)
 
-    case = generate_pcb_case(base_face, pcb_case_wall_height)
-    carry = generate_carrycase(base_face, pcb_case_wall_height)
+    case = generate_pcb_case(cfg, base_face, pcb_case_wall_height)
+    carry = generate_carrycase(cfg, base_face, pcb_case_wall_height)
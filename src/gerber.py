@@ -0,0 +1,214 @@
+"""Read the board outline from a Gerber (RS-274X) edge cuts file.
+
+The outline is drawn by stroking an aperture along lines and arcs, so rendering
+the file gives thin shapes around the board rather than an outline. Instead,
+the paths the aperture is drawn along (its centreline) are read from the draw
+(D01) and move (D02) commands, and converted into svgpathtools curves in board
+coordinates (mm, with Y down like an SVG), for import_curves_as_forced_outline.
+Flashes (D03) and filled regions (G36/G37) aren't part of the outline, so are
+ignored.
+"""
+import cmath
+import math
+import re
+from pathlib import Path
+
+import svgpathtools as svg
+
+try:
+    from kicad_pcb import _arc, _outer_outline
+except ImportError:
+    from .kicad_pcb import _arc, _outer_outline
+
+# Edge cuts from KiCad (.gm1), Protel (.gko) and anything else (.gbr).
+gerber_suffixes = (".gm1", ".gko", ".gbr")
+
+# Extended commands are wrapped in %, other commands end in *.
+_commands_re = re.compile(r"%([^%]*)%|([^%*]*)\*")
+_words_re = re.compile(r"([DGIJMXY])([+-]?[\d.]+)")
+_format_re = re.compile(r"FS([LT])([AI])X(\d)(\d)Y(\d)(\d)")
+_comment_re = re.compile(r"\s*G0*4(?!\d)")
+
+
+def read_outline(gerber_file, tolerance=0.01):
+    """svgpathtools curves of the board outline drawn in gerber_file. Edge
+    cuts can also have cutouts within the board, which a case can't use, so
+    only the connected outline with the largest bounding box is returned.
+
+    Raises:
+        ValueError: gerber_file has coordinates before its format, or draws
+            nothing.
+    """
+    text = Path(gerber_file).read_text(encoding="utf-8", errors="replace")
+    coordinate_format = None
+    scale = 1.0
+    incremental = False
+    interpolation = "G01"
+    multi_quadrant = True
+    in_region = False
+    operation = None
+    position = 0j
+    curves = []
+    for match in _commands_re.finditer(text):
+        if match.group(1) is not None:
+            for command in match.group(1).split("*"):
+                command = command.strip()
+                fs = _format_re.match(command)
+                if fs:
+                    coordinate_format = (fs[1], int(fs[3]), int(fs[4]))
+                    incremental = fs[2] == "I"
+                elif command.startswith("MO"):
+                    scale = 25.4 if command == "MOIN" else 1.0
+            continue
+        if _comment_re.match(match.group(2)):
+            continue
+        command = "".join(match.group(2).split())
+        words = _words_re.findall(command)
+        coordinates = {}
+        for letter, value in words:
+            if letter == "G":
+                code = int(value)
+                if code in (1, 2, 3):
+                    interpolation = f"G0{code}"
+                elif code in (74, 75):
+                    multi_quadrant = code == 75
+                elif code in (36, 37):
+                    in_region = code == 36
+                elif code in (70, 71):
+                    # Units before MO was added to the spec.
+                    scale = 25.4 if code == 70 else 1.0
+            elif letter == "D":
+                code = int(value)
+                if code < 10:
+                    operation = code
+            elif letter in "XYIJ":
+                if coordinate_format is None:
+                    raise ValueError(
+                        f"{gerber_file} has coordinates before its format (FS) is set"
+                    )
+                coordinates[letter] = _coordinate(value, coordinate_format) * scale
+        if not any(letter in "XY" for letter in coordinates):
+            continue
+
+        x = coordinates.get("X", 0.0 if incremental else position.real)
+        y = coordinates.get("Y", 0.0 if incremental else position.imag)
+        end = position + complex(x, y) if incremental else complex(x, y)
+        if operation == 1 and not in_region:
+            if interpolation == "G01":
+                if end != position:
+                    curves.append(svg.Line(_board_point(position), _board_point(end)))
+            else:
+                curves += _arc_curves(
+                    position,
+                    end,
+                    complex(coordinates.get("I", 0.0), coordinates.get("J", 0.0)),
+                    clockwise=interpolation == "G02",
+                    multi_quadrant=multi_quadrant,
+                )
+        position = end
+    if not curves:
+        raise ValueError(f"No outline found in {gerber_file}")
+    outline, ignored = _outer_outline(_merge_arcs(curves, tolerance), tolerance)
+    if ignored:
+        print(
+            f"Warning: ignoring {ignored} shape(s) in {Path(gerber_file).name} that aren't connected to the board outline (e.g. cutouts within the board)."
+        )
+    return outline
+
+
+def _coordinate(value, coordinate_format):
+    """Value of a coordinate word, in the file's units."""
+    if "." in value:
+        # Not allowed by the spec, but some generators write decimals anyway.
+        return float(value)
+    zero_omission, integer_digits, decimal_digits = coordinate_format
+    sign = -1 if value.startswith("-") else 1
+    digits = value.lstrip("+-")
+    if zero_omission == "T":
+        # Trailing zeros omitted (deprecated), so pad them back.
+        digits = digits.ljust(integer_digits + decimal_digits, "0")
+    return sign * int(digits) / 10**decimal_digits
+
+
+def _board_point(p):
+    """Gerber point (Y up) in board coordinates (Y down)."""
+    return p.conjugate()
+
+
+def _arc_curves(start, end, offset, clockwise, multi_quadrant):
+    """Curves of a circular arc from start to end around the center at offset
+    from start (which is unsigned in single quadrant mode), in Gerber
+    coordinates."""
+    if multi_quadrant:
+        center = start + offset
+    else:
+        # The center is whichever of the possible ones gives an arc of at
+        # most 90 degrees with the closest radii at its ends.
+        centers = [
+            start + complex(i * offset.real, j * offset.imag)
+            for i in (1, -1)
+            for j in (1, -1)
+        ]
+        center = min(
+            centers,
+            key=lambda c: (
+                abs(_span(start, end, c, clockwise, False)) > math.pi / 2 + 1e-6,
+                abs(abs(start - c) - abs(end - c)),
+            ),
+        )
+    if start != end:
+        # Move the center onto the bisector of the chord, so the arc has the
+        # same radius at both ends despite I and J being rounded.
+        normal = (end - start) * 1j / abs(end - start)
+        midpoint = (start + end) / 2
+        center = midpoint + normal * ((center - midpoint) * normal.conjugate()).real
+    span = _span(start, end, center, clockwise, multi_quadrant)
+    if span == 0:
+        return []
+
+    def along(fraction):
+        return _board_point(center + (start - center) * cmath.exp(fraction * span * 1j))
+
+    if abs(span) < 2 * math.pi:
+        return [_arc(_board_point(start), along(0.5), _board_point(end))]
+    # Full circle, as two halves.
+    return [
+        _arc(_board_point(start), along(0.25), along(0.5)),
+        _arc(along(0.5), along(0.75), _board_point(start)),
+    ]
+
+
+def _merge_arcs(curves, tolerance):
+    """Join consecutive arcs of the same circle into one, as they are drawn
+    in pieces of at most 90 degrees in single quadrant mode (and by some
+    exporters anyway). Offsetting an outline inwards often fails on the joins
+    between them."""
+    merged = []
+    for curve in curves:
+        last = merged[-1] if merged else None
+        if (
+            isinstance(curve, svg.Arc)
+            and isinstance(last, svg.Arc)
+            and last.end == curve.start
+            and last.sweep == curve.sweep
+            and abs(last.center - curve.center) < tolerance
+            and abs(last.radius.real - curve.radius.real) < tolerance
+            # Arcs are at most a full circle.
+            and abs(last.delta) + abs(curve.delta) < 360 - tolerance
+        ):
+            merged[-1] = _arc(last.start, last.end, curve.end)
+        else:
+            merged.append(curve)
+    return merged
+
+
+def _span(start, end, center, clockwise, multi_quadrant):
+    """Signed angle (anticlockwise positive, with Y up) of the arc around
+    center from start to end."""
+    if start == end:
+        # A full circle, or nothing in single quadrant mode.
+        if not multi_quadrant:
+            return 0
+        return -2 * math.pi if clockwise else 2 * math.pi
+    span = (cmath.phase(end - center) - cmath.phase(start - center)) % (2 * math.pi)
+    return span - 2 * math.pi if clockwise else span
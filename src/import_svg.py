@@ -1,8 +1,10 @@
 import copy
+import math
 import os
 from math import degrees, sqrt
 from pathlib import Path
 from typing import TextIO, Union
+import numpy as np
 import svgpathtools as svg
 
 from build123d.build_enums import CenterOf, Mode, AngularDirection
@@ -16,24 +18,42 @@ from build123d.topology import (
     Wire,
 )
 
-def import_svg_as_forced_outline(
-    svg_file: Union[str, Path, TextIO],
+def import_svg_as_forced_outline(svg_file: Union[str, Path, TextIO], **kwargs) -> Wire:
+    """Import an SVG and apply cleaning operations to return a closed wire
+    outline, if possible. Takes the same keyword args as
+    import_curves_as_forced_outline.
+
+    Raises:
+        FileNotFoundError: the input file cannot be found.
+    """
+    paths = svg.svg2paths(svg_file)[0]
+    curves = []
+    for p in paths:
+        curves.extend(p)
+    return import_curves_as_forced_outline(curves, **kwargs)
+
+
+def import_curves_as_forced_outline(
+    curves: list,
     reorient: bool = True,
     duplicate_tolerance: float = 0.01,
     extra_cleaning=False,
     cleaning_tolerance: float = 0.01,
     simplify_beziers=False,
+    reduce_edges=False,
+    reduction_tolerance: float = 0.02,
 ) -> Wire:
-    """Import an SVG and apply cleaning operations to return a closed wire outline, if possible. Useful for SVG outlines that are actually made of thin shapes or slightly disconnected paths. May fail on more complex shapes.
+    """Apply cleaning operations to svgpathtools curves (e.g. from the paths of an SVG) to return a closed wire outline, if possible. Useful for SVG outlines that are actually made of thin shapes or slightly disconnected paths. May fail on more complex shapes.
 
     * Removes duplicate lines, including ones that are reverses of the other, within a tolerance level (useful for 'outlines' that are actually very thin shapes)
     * Sorts paths such that they are end to start in order of distance, flipping them if needed to line up start to end
     * Goes through each path and creates the next one such that it starts at the end of the last one
     * Ensures the last and first paths are connected
+    * Optionally, replaces runs of lines and curves with as few lines and arcs as possible (see _reduce_edges)
 
 
     Args:
-        svg_file (Union[str, Path, TextIO]): svg file
+        curves (list): svgpathtools curves, in SVG coordinates (Y down).
         reorient (bool, optional): Center result on origin by bounding box, and
         flip objects to compensate for svg orientation (so the resulting wire
         is the same way up as it looks when opened in an SVG viewer). Defaults
@@ -41,10 +61,11 @@ def import_svg_as_forced_outline(
         duplicate_tolerance (float, optional): Amount of tolerance to use considering paths to be duplicates. Defaults to 0.01.
         extra_clean (bool, optional): Do some extra cleaning, mainly skipping tiny paths. Defaults to False.
         cleaning_tolerance (float, optional): Amount of tolerance to use discarding small paths if extra cleaning is used. Defaults to 0.01.
+        reduce_edges (bool, optional): Merge runs of short or collinear paths into fewer lines and arcs. Defaults to False.
+        reduction_tolerance (float, optional): Max distance the reduced outline may stray from the original. Defaults to 0.02.
 
     Raises:
         ValueError: If an unknown path type is encountered.
-        FileNotFoundError: the input file cannot be found.
 
     Returns:
         Wire: Forcefully connected SVG paths as a wire.
@@ -53,12 +74,14 @@ def import_svg_as_forced_outline(
     def point(path_point):
         return (path_point.real, path_point.imag)
 
-    paths = svg.svg2paths(svg_file)[0]
-    curves = []
-    for p in paths:
-        curves.extend(p)
     curves = _remove_duplicate_paths(curves, tolerance=duplicate_tolerance)
     curves = _sort_curves(curves)
+    if reduce_edges:
+        reduced = _reduce_edges(curves, reduction_tolerance)
+        print(
+            f"Edge reduction removed {len(curves) - len(reduced)} of {len(curves)} edges (max deviation {reduction_tolerance})"
+        )
+        curves = reduced
     first_line = curves[0]
     previous_edge = None
     with BuildLine() as bd_l:
@@ -85,17 +108,6 @@ def import_svg_as_forced_outline(
                     continue
             if isinstance(p, svg.Line):
                 edge = Line(line_start, line_end)
-                # if (
-                #     extra_cleaning
-                #     and previous_edge is not None
-                #     and isinstance(previous_edge, Line)
-                #     and abs(edge % 0 - previous_edge % 0) < duplicate_tolerance
-                # ):
-                #     # Merge straight lines that are split into multiple paths.
-                #     add(previous_edge, mode=Mode.SUBTRACT)
-                #     previous_edge = Line(previous_edge @ 0, line_end)
-                #     edge = previous_edge
-                #     add(edge)
             elif isinstance(p, svg.CubicBezier):
                 pts = [line_start, point(p.control1), point(p.control2), line_end]
                 if simplify_beziers:
@@ -172,31 +184,92 @@ def _mirror_around_center(shape, plane):
 def _center_obj(shape):
     return shape.move(Location(-shape.center(center_of=CenterOf.BOUNDING_BOX)))
 
-def _sort_curves(curves):
-    """Return list of paths sorted and flipped so that they are connected end to end as the list iterates."""
+def _sort_curves(curves, tolerance=0.01):
+    """Return list of paths sorted and flipped so that they are connected end to end as the list iterates.
+
+    Greedily picks the curve with the closest endpoint to the end of the last
+    one. Endpoints are kept in a grid of cells, which is searched in growing
+    rings around the last end point until no closer endpoint can exist, so
+    each step only looks at nearby curves. Prints a warning if any of the joins
+    (including closing the loop) have a gap larger than tolerance."""
     if not curves:
         return []
 
     def euclidean_distance(p1, p2):
         return sqrt((p1.real - p2.real) ** 2 + (p1.imag - p2.imag) ** 2)
 
+    # Size cells to the average curve, so neighbouring curves' endpoints are
+    # in the same or adjacent cells.
+    points = [p for c in curves for p in (c.start, c.end)]
+    min_x = min(p.real for p in points)
+    min_y = min(p.imag for p in points)
+    width = max(p.real for p in points) - min_x
+    height = max(p.imag for p in points) - min_y
+    cell_size = (
+        sum(euclidean_distance(c.start, c.end) for c in curves) / len(curves)
+        or max(width, height, 1)
+    )
+
+    def cell(point):
+        return (
+            math.floor((point.real - min_x) / cell_size),
+            math.floor((point.imag - min_y) / cell_size),
+        )
+
+    # Each endpoint is stored as (index of curve, whether it is the end).
+    grid = {}
+    for i, curve in enumerate(curves[1:], start=1):
+        grid.setdefault(cell(curve.start), set()).add((i, False))
+        grid.setdefault(cell(curve.end), set()).add((i, True))
+    max_ring = max(width, height) / cell_size + 2
+
+    def ring(center, r):
+        """Cells at a chessboard distance of r from center."""
+        x, y = center
+        if r == 0:
+            yield center
+            return
+        for dx in range(-r, r + 1):
+            yield (x + dx, y - r)
+            yield (x + dx, y + r)
+        for dy in range(-r + 1, r):
+            yield (x - r, y + dy)
+            yield (x + r, y + dy)
+
     # Start with the first curve
-    sorted_curves = [curves.pop(0)]
-
-    while curves:
-        last_curve = sorted_curves[-1]
-        last_end = last_curve.end
-
-        # Find the closest curve to the previous end point.
-        closest_curve, closest_distance, flip = None, float("inf"), False
-        for curve in curves:
-            dist_start = euclidean_distance(last_end, curve.start)
-            dist_end = euclidean_distance(last_end, curve.end)
-            # If end is closer than start, flip the curve right way around.
-            if dist_start < closest_distance:
-                closest_curve, closest_distance, flip = curve, dist_start, False
-            if dist_end < closest_distance:
-                closest_curve, closest_distance, flip = curve, dist_end, True
+    sorted_curves = [curves[0]]
+    gaps = []
+    for _ in range(len(curves) - 1):
+        last_end = sorted_curves[-1].end
+        center = cell(last_end)
+
+        # Find the closest curve to the previous end point. Ties go to the
+        # earliest curve, and to its start over its end.
+        closest = (float("inf"), 0, False)
+        r = 0
+        # Endpoints in ring r are at least r - 1 cells away, so stop once the
+        # closest found so far is nearer than that. Exactly touching
+        # endpoints are always in the same cell.
+        while (
+            r <= max_ring
+            and closest[0] != 0
+            and not closest[0] < (r - 1) * cell_size * (1 - 1e-9)
+        ):
+            for c in ring(center, r):
+                for i, flip in grid.get(c, ()):
+                    curve = curves[i]
+                    point = curve.end if flip else curve.start
+                    # If end is closer than start, flip the curve right way around.
+                    candidate = (euclidean_distance(last_end, point), i, flip)
+                    if candidate < closest:
+                        closest = candidate
+            r += 1
+        distance, i, flip = closest
+        closest_curve = curves[i]
+        grid[cell(closest_curve.start)].discard((i, False))
+        grid[cell(closest_curve.end)].discard((i, True))
+        if distance > tolerance:
+            gaps.append(distance)
 
         # Flip the curve if necessary
         if flip:
@@ -204,32 +277,179 @@ def _sort_curves(curves):
             sorted_curves.append(flipped)
         else:
             sorted_curves.append(closest_curve)
-        curves.remove(closest_curve)
+
+    closing_gap = euclidean_distance(sorted_curves[-1].end, sorted_curves[0].start)
+    if closing_gap > tolerance:
+        gaps.append(closing_gap)
+    if gaps:
+        print(
+            f"Warning: the outline has {len(gaps)} gap(s) between paths larger than {tolerance} (largest {max(gaps):.3g}). These will be joined with the next path, which may distort the shape."
+        )
 
     return sorted_curves
 
 
+def _reduce_edges(curves, tolerance=0.02, arcs=True):
+    """Replace runs of connected lines and beziers with as few lines and
+    circular arcs (or only lines, if not arcs) as possible, such that the
+    result stays within tolerance of the original, and drop any edges shorter
+    than tolerance that don't fit into a run. Runs are grown greedily for as
+    long as they still fit a single line or arc; existing arcs are kept.
+    Curves are expected to be sorted end to end, as from _sort_curves."""
+    # Points sampled along each bezier to check the fit against.
+    bezier_samples = 8
+    reduced = []
+    # The curves in the current run, and points along them.
+    run_curves = []
+    run = []
+
+    def end_run():
+        if len(run_curves) == 1:
+            reduced.append(run_curves[0])
+        elif run_curves:
+            reduced.append(_fit_curve(np.array(run), tolerance, arcs))
+
+    for c in curves:
+        last_end = run[-1] if run else reduced[-1].end if reduced else None
+        tiny = (
+            last_end is not None
+            and abs(c.end - last_end) < tolerance
+            and c.length() < tolerance
+        )
+        if isinstance(c, svg.Arc) and not tiny:
+            end_run()
+            reduced.append(c)
+            run_curves, run = [], []
+            continue
+        if isinstance(c, (svg.Line, svg.Arc)):
+            # Arcs only get here if tiny, so are as good as lines.
+            points = [c.end]
+        else:
+            points = [c.point(t) for t in np.linspace(0, 1, bezier_samples + 1)[1:]]
+        if run and _fit_curve(np.array(run + points), tolerance, arcs) is not None:
+            run_curves.append(c)
+            run += points
+        elif tiny:
+            # The next edge is joined to the end of the previous one when
+            # building the wire, closing the gap. Measured from the last end
+            # kept, so runs of tiny edges (e.g. flattened curves) don't add
+            # up to a bigger gap.
+            continue
+        else:
+            end_run()
+            run_curves, run = [c], [c.start, *points]
+    end_run()
+    return reduced
+
+
+def _fit_curve(points, tolerance, arcs=True):
+    """Return a line or circular arc (if arcs) from the first to the last of
+    the complex points passing within tolerance of all of them, or None."""
+    start, end = points[0], points[-1]
+    chord = end - start
+    length = abs(chord)
+    if length == 0:
+        return None
+    # Distance of each point from the line through start and end, and how far
+    # along it they are.
+    rel = (points - start) / chord
+    if np.all(np.abs(rel.imag) * length <= tolerance) and np.all(
+        np.diff(rel.real) >= 0
+    ):
+        return svg.Line(start, end)
+    if not arcs:
+        return None
+
+    mid = points[len(points) // 2]
+    center = _circle_center(start, mid, end)
+    if center is None:
+        return None
+    radius = abs(start - center)
+    if np.any(np.abs(np.abs(points - center) - radius) > tolerance):
+        return None
+    # The straight lines between points cut inside the circle by up to their
+    # sagitta.
+    half_chords = np.abs(np.diff(points)) / 2
+    if np.any(half_chords > radius):
+        return None
+    sagittas = radius - np.sqrt(radius**2 - half_chords**2)
+    if np.any(sagittas > tolerance):
+        return None
+    # Going from start through mid to end turns the same way as the arc.
+    sweep = ((mid - start).conjugate() * (end - mid)).imag > 0
+    angles = np.unwrap(np.angle(points - center))
+    span = angles[-1] - angles[0]
+    # Points must go steadily round the circle, not double back.
+    if not (np.all(np.diff(angles) >= 0) or np.all(np.diff(angles) <= 0)):
+        return None
+    return svg.Arc(
+        start,
+        complex(radius, radius),
+        0,
+        large_arc=abs(span) > math.pi,
+        sweep=sweep,
+        end=end,
+    )
+
+
+def _circle_center(a, b, c):
+    """Center of the circle through the complex points a, b and c, or None if
+    they are collinear."""
+    # Solve |z - a| = |z - b| = |z - c| as two perpendicular bisectors.
+    ab, ac = b - a, c - a
+    d = 2 * (ab.real * ac.imag - ab.imag * ac.real)
+    if abs(d) < 1e-12:
+        return None
+    ab2, ac2 = abs(ab) ** 2, abs(ac) ** 2
+    x = (ac.imag * ab2 - ab.imag * ac2) / d
+    y = (ab.real * ac2 - ac.real * ab2) / d
+    return a + complex(x, y)
+
+
 def _remove_duplicate_paths(paths, tolerance=0.01):
     """Remove paths that are identical to within the given positional and
-    parameter tolerance limit, including similar but reversed paths."""
-    cleaned_paths = []
+    parameter tolerance limit, including similar but reversed paths.
 
-    for _, path in enumerate(paths):
+    Kept paths are indexed in a grid of tolerance-sized cells by their start
+    point, so each path is only compared against paths starting near its own
+    start (or, for the reversed comparison, near its own end)."""
+    cleaned_paths = []
+    if tolerance <= 0:
+        # Nothing can be within a tolerance of 0.
+        return [path for path in paths if path.length() != 0]
+
+    def cell(point):
+        return (math.floor(point.real / tolerance), math.floor(point.imag / tolerance))
+
+    def neighbours(point):
+        # Points within tolerance on both axes are at most one cell apart.
+        x, y = cell(point)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                yield from grid.get((x + dx, y + dy), ())
+
+    grid = {}
+    for path in paths:
         if path.length() == 0:
             # Skip zero-length paths
             continue
         # Check if a similar path already exists in the cleaned list (either
         # forward or reversed)
-        flipped = _reverse_svg_curve(path)
-        for _, cleaned_path in enumerate(cleaned_paths):
-            if (
-                _are_paths_similar(path, cleaned_path, tolerance) or
+        if any(
+            _are_paths_similar(path, cleaned_path, tolerance)
+            for cleaned_path in neighbours(path.start)
+        ):
+            continue
+        reverse_candidates = list(neighbours(path.end))
+        if reverse_candidates:
+            flipped = _reverse_svg_curve(path)
+            if any(
                 _are_paths_similar(flipped, cleaned_path, tolerance)
+                for cleaned_path in reverse_candidates
             ):
-                # Skip this path if a similar one is already in the list
-                break
-        else:
-            cleaned_paths.append(path)
+                continue
+        cleaned_paths.append(path)
+        grid.setdefault(cell(path.start), []).append(path)
 
     return cleaned_paths
 
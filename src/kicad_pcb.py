@@ -0,0 +1,292 @@
+"""Read the board outline from the Edge.Cuts layer of a KiCad .kicad_pcb file,
+without KiCad.
+
+The file is one big s-expression. Its tokens are read in a single pass, and
+only the graphic items on Edge.Cuts (and the position of the footprints they
+are in) are built into lists, so the tracks, zones and pads that make up most
+of a board are skipped without being parsed. The items are converted into
+svgpathtools curves in board coordinates (mm, with Y down like an SVG), for
+import_curves_as_forced_outline.
+"""
+import cmath
+import math
+import re
+from pathlib import Path
+
+import svgpathtools as svg
+
+try:
+    from import_svg import _circle_center
+except ImportError:
+    from .import_svg import _circle_center
+
+edge_cuts_layer = "Edge.Cuts"
+# Graphic items, drawn directly on the board (gr_) or in a footprint (fp_).
+item_types = ("line", "rect", "arc", "circle", "curve", "poly")
+
+_open = object()
+_close = object()
+_tokens_re = re.compile(r'\(|\)|"((?:[^"\\]|\\.)*)"|[^\s()"]+')
+
+
+def read_edge_cuts(pcb_file, tolerance=0.01):
+    """svgpathtools curves of the board outline on the Edge.Cuts layer of
+    pcb_file. Edge.Cuts can also have cutouts within the board, which a case
+    can't use, so only the connected outline with the largest bounding box is
+    returned.
+
+    Raises:
+        ValueError: pcb_file isn't a KiCad PCB, or has nothing on Edge.Cuts.
+    """
+    tokens = _tokenize(Path(pcb_file).read_text(encoding="utf-8"))
+    if next(tokens, None) is not _open or next(tokens, None) != "kicad_pcb":
+        raise ValueError(f"{pcb_file} isn't a KiCad PCB file")
+    curves = []
+    for token in tokens:
+        if token is not _open:
+            continue
+        name = next(tokens)
+        if name[3:] in item_types and name.startswith("gr_"):
+            curves += _item_curves(name[3:], _read_list(tokens))
+        elif name in ("footprint", "module"):
+            # "module" in files from KiCad 5 and earlier.
+            curves += _footprint_curves(tokens)
+        else:
+            _skip_list(tokens)
+    if not curves:
+        raise ValueError(f"No {edge_cuts_layer} outline found in {pcb_file}")
+    outline, ignored = _outer_outline(curves, tolerance)
+    if ignored:
+        print(
+            f"Warning: ignoring {ignored} shape(s) on {edge_cuts_layer} that aren't connected to the board outline (e.g. cutouts within the board)."
+        )
+    return outline
+
+
+def _tokenize(text):
+    """Yield _open and _close for parentheses, and the other atoms and strings
+    (without quotes) as str."""
+    for match in _tokens_re.finditer(text):
+        token = match.group()
+        if token == "(":
+            yield _open
+        elif token == ")":
+            yield _close
+        elif match.group(1) is not None:
+            yield re.sub(r"\\(.)", r"\1", match.group(1))
+        else:
+            yield token
+
+
+def _read_list(tokens):
+    """The rest of the list whose opening parenthesis was just read, with
+    sublists as lists."""
+    items = []
+    for token in tokens:
+        if token is _open:
+            items.append(_read_list(tokens))
+        elif token is _close:
+            return items
+        else:
+            items.append(token)
+    raise ValueError("Unexpected end of KiCad PCB file")
+
+
+def _skip_list(tokens):
+    depth = 1
+    for token in tokens:
+        if token is _open:
+            depth += 1
+        elif token is _close:
+            depth -= 1
+            if depth == 0:
+                return
+    raise ValueError("Unexpected end of KiCad PCB file")
+
+
+def _footprint_curves(tokens):
+    """Curves of the Edge.Cuts items in the footprint just opened. Their
+    coordinates are relative to the footprint, before it is rotated."""
+    position, angle = 0j, 0.0
+    items = []
+    for token in tokens:
+        if token is _close:
+            break
+        if token is not _open:
+            continue
+        name = next(tokens)
+        if name == "at":
+            at = _read_list(tokens)
+            position = complex(float(at[0]), float(at[1]))
+            angle = float(at[2]) if len(at) > 2 else 0.0
+        elif name[3:] in item_types and name.startswith("fp_"):
+            items.append((name[3:], _read_list(tokens)))
+        else:
+            _skip_list(tokens)
+    # KiCad angles are anticlockwise as displayed, which is clockwise with Y
+    # down.
+    rotation = cmath.exp(-1j * math.radians(angle))
+
+    def transform(p):
+        # KiCad keeps positions on the board in whole nanometres, so round
+        # the same way to join up with the items that aren't rotated.
+        p = position + p * rotation
+        return complex(round(p.real, 6), round(p.imag, 6))
+
+    curves = []
+    for item_type, item in items:
+        curves += _item_curves(item_type, item, transform=transform)
+    return curves
+
+
+def _item_curves(item_type, item, transform=lambda p: p):
+    """Curves of a graphic item, if it is on Edge.Cuts. transform is applied
+    to each of its points."""
+    if _field(item, "layer") != [edge_cuts_layer]:
+        return []
+
+    def point(name):
+        x, y = _field(item, name)[:2]
+        return transform(complex(float(x), float(y)))
+
+    if item_type == "line":
+        return [svg.Line(point("start"), point("end"))]
+    if item_type == "rect":
+        a, c = point("start"), point("end")
+        b, d = complex(c.real, a.imag), complex(a.real, c.imag)
+        return [svg.Line(a, b), svg.Line(b, c), svg.Line(c, d), svg.Line(d, a)]
+    if item_type == "arc":
+        if _field(item, "mid") is not None:
+            return [_arc(point("start"), point("mid"), point("end"))]
+        # Before KiCad 6, start is the center, end is the start of the arc and
+        # angle is clockwise (with Y down).
+        center, start = point("start"), point("end")
+        angle = math.radians(float(_field(item, "angle")[0]))
+        return [
+            _arc(
+                start,
+                center + (start - center) * cmath.exp(0.5j * angle),
+                center + (start - center) * cmath.exp(1j * angle),
+            )
+        ]
+    if item_type == "circle":
+        center, edge = point("center"), point("end")
+        opposite = 2 * center - edge
+        radius = complex(abs(edge - center), abs(edge - center))
+        return [
+            svg.Arc(edge, radius, 0, False, True, opposite),
+            svg.Arc(opposite, radius, 0, False, True, edge),
+        ]
+    if item_type == "curve":
+        pts = [
+            transform(complex(float(p[1]), float(p[2])))
+            for p in _field(item, "pts")
+            if p[0] == "xy"
+        ]
+        return [svg.CubicBezier(*pts)]
+    if item_type == "poly":
+        return _poly_curves(_field(item, "pts"), transform)
+    return []
+
+
+def _poly_curves(pts, transform):
+    """Curves of a closed polygon's points, which may include arcs (from
+    KiCad 7)."""
+    curves = []
+    last = None
+    first = None
+    for p in pts:
+        if p[0] == "xy":
+            start = end = transform(complex(float(p[1]), float(p[2])))
+            arc = None
+        elif p[0] == "arc":
+            start, mid, end = (
+                transform(complex(*map(float, _field(p[1:], name)[:2])))
+                for name in ("start", "mid", "end")
+            )
+            arc = _arc(start, mid, end)
+        else:
+            continue
+        if last is None:
+            first = start
+        elif last != start:
+            curves.append(svg.Line(last, start))
+        if arc is not None:
+            curves.append(arc)
+        last = end
+    if last is not None and last != first:
+        curves.append(svg.Line(last, first))
+    return curves
+
+
+def _arc(start, mid, end):
+    """Circular arc from start through mid to end (or a line if they are in
+    a line)."""
+    center = _circle_center(start, mid, end)
+    if center is None:
+        return svg.Line(start, end)
+    radius = abs(start - center)
+    # Going from start through mid to end turns the same way as the arc.
+    sweep = ((mid - start).conjugate() * (end - mid)).imag > 0
+    span = (cmath.phase(end - center) - cmath.phase(start - center)) % (2 * math.pi)
+    if not sweep:
+        span = 2 * math.pi - span
+    return svg.Arc(
+        start,
+        complex(radius, radius),
+        0,
+        large_arc=span > math.pi,
+        sweep=sweep,
+        end=end,
+    )
+
+
+def _field(item, name):
+    """The values of the first sublist of item named name, or None."""
+    for value in item:
+        if isinstance(value, list) and value and value[0] == name:
+            return value[1:]
+    return None
+
+
+def _outer_outline(curves, tolerance):
+    """The curves connected (end to end, within tolerance) to each other with
+    the largest bounding box, in their original order, and the number of other
+    connected shapes that were left out."""
+    # Union-find of the curves, joining curves with endpoints within
+    # tolerance. Endpoints are found in a grid of tolerance-sized cells.
+    parent = list(range(len(curves)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def cell(point):
+        return (math.floor(point.real / tolerance), math.floor(point.imag / tolerance))
+
+    grid = {}
+    for i, curve in enumerate(curves):
+        for point in (curve.start, curve.end):
+            x, y = cell(point)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for j, other in grid.get((x + dx, y + dy), ()):
+                        if abs(point - other) <= tolerance:
+                            parent[root(i)] = root(j)
+            grid.setdefault((x, y), []).append((i, point))
+
+    groups = {}
+    for i, curve in enumerate(curves):
+        groups.setdefault(root(i), []).append(curve)
+    if len(groups) == 1:
+        return curves, 0
+
+    def bbox_area(group):
+        boxes = [c.bbox() for c in group]
+        width = max(b[1] for b in boxes) - min(b[0] for b in boxes)
+        height = max(b[3] for b in boxes) - min(b[2] for b in boxes)
+        return width * height
+
+    return max(groups.values(), key=bbox_area), len(groups) - 1
@@ -0,0 +1,189 @@
+"""Mesh export working on numpy arrays, so a shape is only tessellated once even
+when it is written more than once (e.g. as its mirror image)."""
+import zipfile
+
+import numpy as np
+from build123d import Shape
+from OCP.BRep import BRep_Tool
+from OCP.BRepTools import BRepTools
+from OCP.TopAbs import TopAbs_Orientation
+from OCP.TopLoc import TopLoc_Location
+
+# Defaults of build123d's export_stl.
+default_tolerance = 1e-3
+default_angular_tolerance = 0.1
+
+_stl_dtype = np.dtype(
+    [
+        ("normal", "<f4", (3,)),
+        ("vertices", "<f4", (3, 3)),
+        ("attribute", "<u2"),
+    ]
+)
+
+
+def tessellate(
+    shape: Shape,
+    tolerance=default_tolerance,
+    angular_tolerance=default_angular_tolerance,
+):
+    """Triangulate shape, returning an (n, 3) array of vertices and an (m, 3)
+    array of vertex indices for each triangle, wound anticlockwise when seen
+    from outside."""
+    # Meshing keeps any existing triangulation that is at least as fine, which
+    # shapes shared between builds (e.g. in watch mode) may have from an
+    # earlier export, so remove it to always get the tolerances asked for.
+    BRepTools.Clean_s(shape.wrapped)
+    shape.mesh(tolerance, angular_tolerance)
+    vertices = []
+    triangles = []
+    offset = 0
+    for face in shape.faces():
+        loc = TopLoc_Location()
+        poly = BRep_Tool.Triangulation_s(face.wrapped, loc)
+        if poly is None:
+            continue
+        nodes = np.array([poly.Node(i).Coord() for i in range(1, poly.NbNodes() + 1)])
+        if not loc.IsIdentity():
+            trsf = loc.Transformation()
+            matrix = np.array(
+                [[trsf.Value(r, c) for c in range(1, 5)] for r in range(1, 4)]
+            )
+            nodes = nodes @ matrix[:, :3].T + matrix[:, 3]
+        vertices.append(nodes)
+        tris = np.array(
+            [poly.Triangle(i).Get() for i in range(1, poly.NbTriangles() + 1)]
+        )
+        tris = tris - 1 + offset
+        if face.wrapped.Orientation() == TopAbs_Orientation.TopAbs_REVERSED:
+            tris = tris[:, [0, 2, 1]]
+        triangles.append(tris)
+        offset += poly.NbNodes()
+    if not vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=int)
+    return np.concatenate(vertices), np.concatenate(triangles)
+
+
+def mirror_x(vertices, triangles):
+    """Mirror a mesh about the YZ plane. Reverses the winding so the mirrored
+    triangles still face outwards."""
+    mirrored = vertices * (-1, 1, 1)
+    return mirrored, triangles[:, [0, 2, 1]]
+
+
+def weld(vertices, triangles, decimals=6):
+    """Merge vertices at the same position (e.g. shared by neighbouring faces)
+    so the mesh is connected, dropping triangles that collapse as a result."""
+    unique, inverse = np.unique(
+        np.round(vertices, decimals), axis=0, return_inverse=True
+    )
+    triangles = inverse.reshape(-1)[triangles]
+    collapsed = (
+        (triangles[:, 0] == triangles[:, 1])
+        | (triangles[:, 1] == triangles[:, 2])
+        | (triangles[:, 0] == triangles[:, 2])
+    )
+    return unique, triangles[~collapsed]
+
+
+def write_stl(path, vertices, triangles):
+    """Write a mesh as a binary STL file."""
+    corners = vertices[triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    data = np.zeros(len(triangles), dtype=_stl_dtype)
+    data["normal"] = normals
+    data["vertices"] = corners
+    with open(path, "wb") as f:
+        f.write(b"Binary STL written by snakeskin".ljust(80, b"\0"))
+        f.write(np.uint32(len(data)).tobytes())
+        data.tofile(f)
+
+
+# Gap between parts laid out on the build plate of a 3MF bundle.
+bundle_spacing = 10
+
+_3mf_content_types = """<?xml version="1.0" encoding="UTF-8"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+ <Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+ <Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>
+</Types>
+"""
+_3mf_rels = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+ <Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>
+</Relationships>
+"""
+
+
+def write_3mf(path, parts):
+    """Write meshes as the objects of one 3MF package, laid out side by side
+    along X.
+
+    parts is a list of (name, vertices, triangles, mirrored_name) tuples. If
+    mirrored_name is not None, a mirror image of the part about the YZ plane is
+    added under that name, sharing the same mesh with a mirroring transform.
+    """
+    from xml.sax.saxutils import quoteattr
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", _3mf_content_types)
+        z.writestr("_rels/.rels", _3mf_rels)
+        with z.open("3D/3dmodel.model", "w") as f:
+            f.write(
+                b'<?xml version="1.0" encoding="UTF-8"?>\n'
+                b'<model unit="millimeter" xml:lang="en-US" '
+                b'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+                b"<resources>\n"
+            )
+            items = []
+            x = 0
+            next_id = 1
+            for name, vertices, triangles, mirrored_name in parts:
+                # 3MF meshes should be connected, unlike STL's loose triangles.
+                vertices, triangles = weld(vertices, triangles)
+                mesh_id = next_id
+                next_id += 1
+                # Meshes are streamed straight into the archive rather than
+                # building the whole document in memory.
+                f.write(
+                    f"<object id=\"{mesh_id}\" name={quoteattr(name)} type=\"model\">\n"
+                    "<mesh>\n<vertices>\n".encode()
+                )
+                np.savetxt(f, vertices, fmt='<vertex x="%.6f" y="%.6f" z="%.6f"/>')
+                f.write(b"</vertices>\n<triangles>\n")
+                np.savetxt(f, triangles, fmt='<triangle v1="%d" v2="%d" v3="%d"/>')
+                f.write(b"</triangles>\n</mesh>\n</object>\n")
+
+                low, high = vertices.min(axis=0), vertices.max(axis=0)
+                items.append((mesh_id, (1, x - low[0], -low[1], -low[2])))
+                x += high[0] - low[0] + bundle_spacing
+                if mirrored_name is None:
+                    continue
+                # The mirror image only refers to the mesh above.
+                f.write(
+                    f"<object id=\"{next_id}\" name={quoteattr(mirrored_name)} type=\"model\">\n"
+                    f"<components><component objectid=\"{mesh_id}\" "
+                    f"transform=\"{_3mf_transform(-1, 0, 0, 0)}\"/></components>\n"
+                    "</object>\n".encode()
+                )
+                items.append((next_id, (1, x + high[0], -low[1], -low[2])))
+                x += high[0] - low[0] + bundle_spacing
+                next_id += 1
+
+            f.write(b"</resources>\n<build>\n")
+            for object_id, transform in items:
+                f.write(
+                    f"<item objectid=\"{object_id}\" "
+                    f"transform=\"{_3mf_transform(*transform)}\"/>\n".encode()
+                )
+            f.write(b"</build>\n</model>\n")
+
+
+def _3mf_transform(x_scale, dx, dy, dz):
+    """3MF's row-major 4x3 matrix for a scale of X then a translation."""
+    # Adding 0 avoids writing -0.
+    dx, dy, dz = (d + 0.0 for d in (dx, dy, dz))
+    return f"{x_scale} 0 0 0 1 0 0 0 1 {dx:.6f} {dy:.6f} {dz:.6f}"
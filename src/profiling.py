@@ -0,0 +1,197 @@
+"""Per-stage timing and geometry complexity instrumentation.
+
+Wrap code in ``stage(name)`` (or decorate a function with ``profiled(name)``)
+to record it. Nothing is recorded unless a ``profile()`` context is active:
+
+    with profile() as report:
+        generate_cases(svg_file)
+    print(report.summary())
+    report.write_json("profile.json")
+"""
+import json
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+_report = None
+_stack = []
+
+
+class Stage:
+    """Record of one run of a stage. Set result to the shape (or list of
+    shapes) the stage produced to record its complexity."""
+
+    def __init__(self, name):
+        self.name = name
+        self.result = None
+        self.seconds = None
+        self.peak_rss_mb = None
+        self.rss_increase_mb = None
+        self.counts = {}
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "seconds": self.seconds,
+            "peak_rss_mb": self.peak_rss_mb,
+            "rss_increase_mb": self.rss_increase_mb,
+            **self.counts,
+        }
+
+
+class Report:
+    def __init__(self):
+        self.stages = []
+        # Other named counters (e.g. cache hits) to include in the report.
+        self.counters = {}
+        # Notable things that happened during the build (e.g. timeouts), as
+        # dicts with a "kind" and details.
+        self.events = []
+
+    def merge(self, other):
+        """Add the stages and counters of another report's dict, e.g. one
+        recorded in a worker process."""
+        self.stages.extend(other["stages"])
+        self.events.extend(other.get("events", []))
+        for name, value in other["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        return {"stages": self.stages, "counters": self.counters, "events": self.events}
+
+    def write_json(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2))
+
+    def summary(self):
+        """Table of stages, slowest first."""
+        stages = sorted(self.stages, key=lambda s: s["seconds"], reverse=True)
+        name_w = max([len("stage"), *(len(s["name"]) for s in stages)])
+        header = f"{'stage':<{name_w}}  {'time (s)':>8}  {'peak RSS (MB)':>13}  {'faces':>6}  {'edges':>6}  {'solids':>6}"
+        lines = [header, "-" * len(header)]
+        for s in stages:
+            peak = "" if s["peak_rss_mb"] is None else f"{s['peak_rss_mb']:.0f}"
+            lines.append(
+                f"{s['name']:<{name_w}}  {s['seconds']:>8.2f}  {peak:>13}"
+                + "".join(f"  {s.get(k, ''):>6}" for k in ("faces", "edges", "solids"))
+            )
+        for name, value in self.counters.items():
+            lines.append(f"{name}: {value}")
+        for e in self.events:
+            details = ", ".join(f"{k}={v}" for k, v in e.items() if k != "kind")
+            lines.append(f"{e['kind']}: {details}")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile():
+    """Record all stages run within this context into the yielded Report."""
+    global _report
+    previous = _report
+    _report = Report()
+    try:
+        yield _report
+    finally:
+        _report = previous
+
+
+def enabled():
+    return _report is not None
+
+
+def merge(other):
+    """Merge a report dict recorded elsewhere into the active report."""
+    if _report is not None:
+        _report.merge(other)
+
+
+def count(name, amount=1):
+    """Add to a named counter in the active report."""
+    if _report is not None:
+        _report.counters[name] = _report.counters.get(name, 0) + amount
+
+
+def event(kind, **details):
+    """Record something notable in the active report, e.g. an operation timing
+    out."""
+    if _report is not None:
+        _report.events.append({"kind": kind, "stage": "/".join(_stack), **details})
+
+
+@contextmanager
+def stage(name):
+    """Record the wall time, peak memory and result complexity of the code
+    within. Stages nested within other stages are named by their path, e.g.
+    'case/lip'."""
+    record = Stage(name)
+    if _report is None:
+        yield record
+        return
+    _stack.append(name)
+    record.name = "/".join(_stack)
+    peak_before = _peak_rss_mb()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        _stack.pop()
+        record.peak_rss_mb = _peak_rss_mb()
+        if peak_before is not None:
+            record.rss_increase_mb = record.peak_rss_mb - peak_before
+        record.counts = _count_topology(record.result)
+        _report.stages.append(record.to_dict())
+
+
+def profiled(name):
+    """Decorator recording each call of the function as a stage, with its
+    return value as the result."""
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with stage(name) as s:
+                s.result = f(*args, **kwargs)
+            return s.result
+
+        return wrapper
+
+    return decorator
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # Operations with a time limit run in forked children (see timeouts),
+    # so include the largest child that has finished.
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Linux reports kB, macOS reports bytes.
+    if sys.platform == "darwin":
+        return peak / 1024**2
+    return peak / 1024
+
+
+def _count_topology(result):
+    if result is None:
+        return {}
+    shapes = result if isinstance(result, (list, tuple)) else [result]
+    counts = {"faces": 0, "edges": 0, "solids": 0}
+    for shape in shapes:
+        if not hasattr(shape, "faces"):
+            return {}
+        counts["faces"] += len(shape.faces())
+        counts["edges"] += len(shape.edges())
+        counts["solids"] += len(shape.solids())
+    return counts
@@ -0,0 +1,459 @@
+"""Job server that builds cases on request, for driving snakeskin from other
+programs (e.g. a web configurator) without paying the startup and CAD import
+cost for every build.
+
+    snakeskin serve --port 8765 -j 2
+
+Builds run in a pool of worker processes that stay up between jobs, keeping
+their imports and in-memory stage caches warm. The API takes and returns JSON,
+except for downloads:
+
+    POST /jobs                      Submit a job: {"svg": "<svg ...>", "config":
+                                    {...params}, "name": "my_board"}. Only svg
+                                    is required. Returns the job, with its id.
+    GET  /jobs                      All jobs, oldest first.
+    GET  /jobs/<id>[?wait=seconds]  A job's status, progress, timings and output
+                                    files. With wait, blocks until the job has
+                                    finished or the time is up.
+    GET  /jobs/<id>/files/<file>    The bytes of an output file.
+    GET  /status                    Queue depth and number of jobs in each state.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import socketserver
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from build_cache import BuildCache, default_cache_dir
+    from default_params import default_params
+except ImportError:
+    from .build_cache import BuildCache, default_cache_dir
+    from .default_params import default_params
+
+default_port = 8765
+# Finished jobs to keep, with their output files, before the oldest is deleted.
+default_keep_jobs = 100
+# Larger requests are rejected rather than read into memory.
+max_request_mb = 20
+content_types = {
+    ".stl": "model/stl",
+    ".step": "model/step",
+    ".3mf": "model/3mf",
+}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    build_cache = None if args.no_cache else BuildCache(args.cache_dir)
+    jobs = JobQueue(
+        Path(args.output_dir).expanduser(),
+        args.jobs or os.cpu_count() or 1,
+        build_cache,
+        args.keep_jobs,
+    )
+    if args.socket:
+        socket_path = Path(args.socket).expanduser()
+        socket_path.unlink(missing_ok=True)
+        httpd = _UnixHTTPServer(str(socket_path), _Handler)
+        address = f"unix socket {socket_path}"
+    else:
+        httpd = ThreadingHTTPServer((args.host, args.port), _Handler)
+        address = f"http://{args.host}:{httpd.server_port}"
+    httpd.jobs = jobs
+    print(f"Serving on {address} with {jobs.workers} workers...")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        jobs.shutdown()
+        if args.socket:
+            socket_path.unlink(missing_ok=True)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="snakeskin serve",
+        description="Serve a local HTTP API that builds cases in a pool of warm worker processes.",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on. Defaults to 127.0.0.1, so only local programs can connect.",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=default_port,
+        help=f"Port to listen on. Defaults to {default_port}.",
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        help="Listen on this Unix socket instead of a TCP port.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=default_params["output_dir"] / "serve",
+        help="Directory to write each job's input and output files to, in a directory named by its id.",
+    )
+    parser.add_argument(
+        "--keep-jobs",
+        type=int,
+        default=default_keep_jobs,
+        help=f"Number of finished jobs to keep. Older ones are forgotten and their directories deleted. Defaults to {default_keep_jobs}.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rebuild every part from scratch, without reading or writing the build cache.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=default_cache_dir,
+        help=f"Directory to cache generated parts in between runs. Defaults to {default_cache_dir}.",
+    )
+    return parser.parse_args(argv)
+
+
+class JobQueue:
+    """Jobs submitted to the server, and the pool of workers building them.
+    Each job is a dict, as returned by the API."""
+
+    def __init__(self, output_dir, workers, build_cache=None, keep_jobs=default_keep_jobs):
+        self.output_dir = output_dir
+        self.workers = workers
+        self.build_cache = build_cache
+        self.keep_jobs = keep_jobs
+        # Oldest first, which is the order finished jobs are evicted in.
+        self._jobs = {}
+        self._futures = {}
+        self._ids = itertools.count(1)
+        # Notified whenever a job changes.
+        self._changed = threading.Condition()
+        # Workers report progress on this, since their jobs' dicts are in this
+        # process.
+        self._events = multiprocessing.Queue()
+        self._start_pool()
+        self._event_thread = threading.Thread(target=self._handle_events, daemon=True)
+        self._event_thread.start()
+
+    def submit(self, svg, config=None, name="outline"):
+        """Queue a build of the svg outline text with the params in config."""
+        config = dict(config or {})
+        unknown = [k for k in config if k not in default_params]
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(unknown)}")
+        name = Path(name).name or "outline"
+
+        with self._changed:
+            job_id = str(next(self._ids))
+            job_dir = self.output_dir / job_id
+            job_dir.mkdir(parents=True, exist_ok=True)
+            svg_path = (job_dir / name).with_suffix(".svg")
+            svg_path.write_text(svg)
+            config["output_dir"] = job_dir
+            job = {
+                "id": job_id,
+                "name": name,
+                "status": "queued",
+                "error": None,
+                "submitted": time.time(),
+                "queue_seconds": None,
+                "build_seconds": None,
+                "progress": {"parts_done": 0, "parts_total": None, "last_part": None},
+                "stages": {},
+                "output_dir": str(job_dir / name),
+                "files": {},
+            }
+            try:
+                future = self._pool.submit(
+                    _run_job, job_id, svg_path, config, self.build_cache
+                )
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for running out of memory), which
+                # breaks the whole pool, so start a new one.
+                print("Warning: a worker process died, restarting the workers")
+                self._fail_orphans()
+                self._start_pool()
+                try:
+                    future = self._pool.submit(
+                        _run_job, job_id, svg_path, config, self.build_cache
+                    )
+                except BrokenProcessPool:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+                    raise
+            # Only added once submitted, so it can't be left queued forever.
+            self._jobs[job_id] = job
+            self._futures[job_id] = future
+            # Added after the job, as it's called right away if it's done.
+            future.add_done_callback(lambda f: self._finish(job_id, f))
+            return self._copy(job_id)
+
+    def job(self, job_id, wait=0):
+        """Copy of the job's dict, or None if there is no such job. Waits up to
+        wait seconds for it to finish."""
+        deadline = time.monotonic() + wait
+        with self._changed:
+            while (
+                job_id in self._jobs
+                and self._jobs[job_id]["status"] in ("queued", "running")
+                and time.monotonic() < deadline
+            ):
+                self._changed.wait(deadline - time.monotonic())
+            return self._copy(job_id)
+
+    def jobs(self):
+        with self._changed:
+            return [self._copy(job_id) for job_id in self._jobs]
+
+    def status(self):
+        with self._changed:
+            counts = {s: 0 for s in ("queued", "running", "done", "failed")}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return {"workers": self.workers, "queue_depth": counts["queued"], **counts}
+
+    def file_path(self, job_id, file_name):
+        """Path of one of a finished job's output files, or None."""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or file_name not in job["files"]:
+                return None
+            return Path(job["files"][file_name])
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._events.put(None)
+
+    def _start_pool(self):
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self._events,),
+        )
+        # Start the workers now, so the first jobs don't wait for imports.
+        for _ in range(self.workers):
+            self._pool.submit(_warm_up)
+
+    def _fail_orphans(self):
+        """Fail the unfinished jobs of a broken pool that will never finish."""
+        for job_id, job in self._jobs.items():
+            future = self._futures.get(job_id)
+            if job["status"] in ("queued", "running") and (future is None or future.done()):
+                job["status"] = "failed"
+                job["error"] = "BrokenProcessPool: a worker process died"
+                self._futures.pop(job_id, None)
+        self._evict()
+        self._changed.notify_all()
+
+    def _evict(self):
+        """Forget the oldest finished jobs beyond keep_jobs, deleting their
+        files."""
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job["status"] not in ("queued", "running")
+        ]
+        for job_id in finished[: max(len(finished) - self.keep_jobs, 0)]:
+            del self._jobs[job_id]
+            shutil.rmtree(self.output_dir / job_id, ignore_errors=True)
+
+    def _copy(self, job_id):
+        job = self._jobs.get(job_id)
+        return None if job is None else json.loads(json.dumps(job))
+
+    def _handle_events(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            job_id, kind, data = event
+            with self._changed:
+                job = self._jobs.get(job_id)
+                # Events can arrive after the result, which comes separately
+                # (and after the job has been evicted).
+                if job is None or job["status"] not in ("queued", "running"):
+                    continue
+                if kind == "started":
+                    job["status"] = "running"
+                    job["queue_seconds"] = time.time() - job["submitted"]
+                elif kind == "progress":
+                    job["progress"] = data
+                self._changed.notify_all()
+
+    def _finish(self, job_id, future):
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            # e.g. the worker crashed.
+            result = {"error": f"{type(e).__name__}: {e}", "build_seconds": None, "stages": {}}
+        with self._changed:
+            self._futures.pop(job_id, None)
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] not in ("queued", "running"):
+                # Already failed by _fail_orphans.
+                return
+            job.update(result)
+            job["status"] = "failed" if result["error"] else "done"
+            out_dir = Path(job["output_dir"])
+            if out_dir.is_dir():
+                job["files"] = {
+                    f.name: str(f.resolve()) for f in sorted(out_dir.iterdir())
+                }
+            self._evict()
+            self._changed.notify_all()
+        print(f"Job {job_id} ({job['name']}) {job['status']}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        jobs = self.server.jobs
+        if parts == ["status"]:
+            return self._send_json(jobs.status())
+        if parts == ["jobs"]:
+            return self._send_json(jobs.jobs())
+        if len(parts) == 2 and parts[0] == "jobs":
+            try:
+                wait = float(parse_qs(url.query).get("wait", ["0"])[0])
+            except ValueError:
+                return self._send_error(HTTPStatus.BAD_REQUEST, "wait must be a number")
+            job = jobs.job(parts[1], wait)
+            if job is None:
+                return self._send_error(HTTPStatus.NOT_FOUND, f"No job {parts[1]}")
+            return self._send_json(job)
+        if len(parts) == 4 and parts[0] == "jobs" and parts[2] == "files":
+            path = jobs.file_path(parts[1], parts[3])
+            if path is None or not path.is_file():
+                return self._send_error(HTTPStatus.NOT_FOUND, f"No file {parts[3]}")
+            return self._send(
+                HTTPStatus.OK,
+                path.read_bytes(),
+                content_types.get(path.suffix, "application/octet-stream"),
+            )
+        self._send_error(HTTPStatus.NOT_FOUND, f"Unknown path {url.path}")
+
+    def do_POST(self):
+        if urlparse(self.path).path.strip("/") != "jobs":
+            return self._send_error(HTTPStatus.NOT_FOUND, f"Unknown path {self.path}")
+        length = int(self.headers.get("Content-Length", 0))
+        if length > max_request_mb * 1024**2:
+            return self._send_error(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f"Requests must be smaller than {max_request_mb} MB",
+            )
+        try:
+            request = json.loads(self.rfile.read(length))
+            job = self.server.jobs.submit(
+                request["svg"], request.get("config"), request.get("name", "outline")
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send_error(HTTPStatus.BAD_REQUEST, f"Invalid job: {e}")
+        except (BrokenProcessPool, RuntimeError) as e:
+            # The new pool broke too, or the server is shutting down.
+            return self._send_error(
+                HTTPStatus.SERVICE_UNAVAILABLE, f"Couldn't start the job: {e}"
+            )
+        self._send_json(job, HTTPStatus.ACCEPTED)
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return self.client_address[0] if self.client_address else "unix socket"
+
+    def _send_json(self, obj, status=HTTPStatus.OK):
+        self._send(status, json.dumps(obj, indent=2).encode(), "application/json")
+
+    def _send_error(self, status, message):
+        self._send_json({"error": message}, status)
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+_events = None
+
+
+def _init_worker(events):
+    # Pay the CAD import cost once per worker rather than once per job.
+    global _events
+    _events = events
+    try:
+        import generate_pcb_case
+    except ImportError:
+        from . import generate_pcb_case
+
+
+def _warm_up():
+    pass
+
+
+def _run_job(job_id, svg, params, build_cache):
+    """Build a job in a worker, returning its timings and error (if any)."""
+    try:
+        import profiling
+        from generate_pcb_case import generate_cases
+    except ImportError:
+        from . import profiling
+        from .generate_pcb_case import generate_cases
+
+    _events.put((job_id, "started", None))
+
+    def progress(part, done, total):
+        _events.put(
+            (job_id, "progress", {"parts_done": done, "parts_total": total, "last_part": part})
+        )
+
+    start = time.perf_counter()
+    error = None
+    with profiling.profile() as report:
+        try:
+            generate_cases(
+                svg, user_params=params, build_cache=build_cache, progress=progress
+            )
+        except (Exception, SystemExit) as e:
+            traceback.print_exc()
+            error = f"{type(e).__name__}: {e}".splitlines()[0]
+    # Only the parts and other top level stages, not the stages within them.
+    stages = {}
+    for s in report.stages:
+        if "/" not in s["name"]:
+            stages[s["name"]] = stages.get(s["name"], 0) + s["seconds"]
+    return {
+        "error": error,
+        "build_seconds": time.perf_counter() - start,
+        "stages": stages,
+    }
@@ -2,27 +2,111 @@ import argparse
 import json
 import subprocess
 import sys
-import tempfile
+import time
 from pathlib import Path
 
+# generate_pcb_case (and with it build123d and OCP) takes seconds to import, so
+# it is only imported once there is something to build. --help, argument errors
+# and input conversion don't need it.
 try:
-    from default_params import default_params
-    from generate_pcb_case import generate_cases
+    import batch
+    import server
+    from build_cache import BuildCache, default_cache_dir
+    from default_params import default_params, param_choices
+    import profiling
 except ImportError:
-    from .default_params import default_params
-    from .generate_pcb_case import generate_cases
+    from . import batch
+    from . import server
+    from .build_cache import BuildCache, default_cache_dir
+    from .default_params import default_params, param_choices
+    from . import profiling
 
 script_dir = Path(__file__).parent
 default_build_dir = default_params["output_dir"]
+# Args that control the program rather than the case design.
+cli_args = ["input_file", "config", "no_cache", "cache_dir", "jobs", "profile", "watch"]
 
 
 def main():
+    if sys.argv[1:2] == ["batch"]:
+        sys.exit(batch.main(sys.argv[2:]))
+    if sys.argv[1:2] == ["serve"]:
+        sys.exit(server.main(sys.argv[2:]))
     args = parse_args()
     if args.output_dir:
         args.output_dir = resolve_output_dir(args.output_dir)
         args.output_dir.mkdir(parents=True, exist_ok=True)
     default_build_dir.mkdir(parents=True, exist_ok=True)
 
+    if args.watch:
+        watch(args)
+    else:
+        build(args)
+
+
+def build(args, skip_unchanged=False):
+    """Build the case parts for the input file with the params from the
+    config and CLI args."""
+    param_overrides = load_params(args)
+    svg = input_svg(args.input_file)
+    try:
+        from generate_pcb_case import generate_cases
+    except ImportError:
+        from .generate_pcb_case import generate_cases
+
+    build_cache = None if args.no_cache else BuildCache(args.cache_dir)
+    # Watch mode builds in this process, so its stage cache is kept between
+    # rebuilds.
+    jobs = 1 if skip_unchanged else args.jobs
+    if not args.profile:
+        generate_cases(
+            svg,
+            user_params=param_overrides,
+            build_cache=build_cache,
+            jobs=jobs,
+            skip_unchanged=skip_unchanged,
+        )
+        return
+    with profiling.profile() as report:
+        cfg = generate_cases(
+            svg,
+            user_params=param_overrides,
+            build_cache=build_cache,
+            jobs=jobs,
+            skip_unchanged=skip_unchanged,
+        )
+    print(report.summary())
+    report_path = cfg["output_dir"] / svg.stem / "profile.json"
+    report.write_json(report_path)
+    print(f"Profile written to {report_path}")
+
+
+def watch(args, interval=1):
+    """Rebuild whenever the input file or config changes, until interrupted.
+    Only the stages reading changed params are recomputed, and only the parts
+    that changed are exported again."""
+    watched = [Path(args.input_file).expanduser()]
+    if args.config:
+        watched.append(Path(args.config).expanduser())
+    last_seen = None
+    try:
+        while True:
+            seen = [p.stat().st_mtime if p.exists() else None for p in watched]
+            if seen != last_seen:
+                last_seen = seen
+                try:
+                    build(args, skip_unchanged=True)
+                except (Exception, SystemExit) as e:
+                    # Keep watching so the error can be fixed.
+                    print(f"Build failed: {e}")
+                print(f"Watching {', '.join(str(p) for p in watched)} for changes...")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def load_params(args):
+    """Params from the config file, overridden by those given as CLI args."""
     if args.config:
         config = Path(args.config).expanduser()
         print(f"Reading config from {str(config)}...")
@@ -30,42 +114,38 @@ def main():
     else:
         param_overrides = {}
     for k, v in vars(args).items():
-        if k not in default_params and k not in ["input_file", "config"]:
+        if k not in default_params and k not in cli_args:
             print(f"Warning: Unknown parameter '{k}'")
         elif v is not None:
             param_overrides[k] = v
+    return param_overrides
 
-    input_file = Path(args.input_file).expanduser()
-    if input_file.suffix == ".gm1":
-        print(
-            "Warning: .gm1 files are not fully supported. They are not pure outlines, they are thin shapes. Snakeskin will convert it to an SVG file for you to fix (note: requires installing pygerber). See readme#Gerber for details."
-        )
-        svg = gerber_to_svg(input_file)
-        sys.exit(f"Please modify '{svg}' to be a path-based outline, then call the program again with that file.")
-    elif input_file.suffix == ".svg":
-        svg = input_file
-    elif input_file.suffix == ".kicad_pcb":
-        svg = pcb_to_svg(input_file)
+
+def input_svg(input_file):
+    """Path of an SVG outline (or .kicad_pcb or Gerber, which are read
+    directly) for the input file, converting it if needed."""
+    input_file = Path(input_file).expanduser()
+    if input_file.suffix in (".svg", ".kicad_pcb", ".gm1", ".gko", ".gbr"):
+        return input_file
     # elif input_file.suffix == ".dxf":
-    #     svg = dxf_to_svg(input_file)
+    #     return dxf_to_svg(input_file)
     else:
         # Exit with error.
         sys.exit(
-            f"Unknown file type (please check the readme): {args.input_file.suffix}"
+            f"Unknown file type (please check the readme): {input_file.suffix}"
         )
 
-    generate_cases(svg, user_params=param_overrides)
-
 
 def parse_args():
     parser = argparse.ArgumentParser(
-        description="Generate case files from Gerber edge cuts or PCB outline SVG."
+        description="Generate case files from Gerber edge cuts or PCB outline SVG.",
+        epilog="Use 'snakeskin batch --help' to build a whole directory of outlines at once, or 'snakeskin serve --help' to build on request over a local HTTP API.",
     )
 
     parser.add_argument(
         "input_file",
         type=Path,
-        help="Path to the input Gerber edge cuts file (.gm1) or an SVG outline file.",
+        help="Path to the input KiCad PCB (.kicad_pcb), Gerber edge cuts file (.gm1, .gko or .gbr) or an SVG outline file.",
     )
     parser.add_argument(
         "-c",
@@ -73,12 +153,42 @@ def parse_args():
         type=Path,
         help="Path to a JSON configuration file to override default parameters. Any parameters that are also provided as CLI args will take the CLI value.",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes to build independent parts (case, carrycase, tenting flaps) in parallel. Defaults to 1.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Rebuild every part from scratch, without reading or writing the build cache.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=default_cache_dir,
+        help=f"Directory to cache generated parts in between runs. Defaults to {default_cache_dir}.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time, peak memory and geometry complexity of each build stage, and write them to profile.json in the output directory.",
+    )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="Keep running, and rebuild whenever the input file or config changes. Only the parts that changed are exported again.",
+    )
 
     # Add all default params as arguments
     for key, value in default_params.items():
         parser.add_argument(
             f"--{key}",
             type=type(value),
+            choices=param_choices.get(key),
             # default=value,
             help=f"Override default value for {key}. Defaults to {value}.",
         )
@@ -95,61 +205,6 @@ def resolve_output_dir(output_path):
         return default_build_dir / output_path
 
 
-def gerber_to_svg(input_file):
-    from pygerber.gerberx3.api.v2 import GerberFile
-    # First convert gerber to svg
-    gerber = GerberFile.from_file(input_file).parse()
-    svg_file = default_build_dir / input_file.with_suffix(".svg").name
-    gerber.render_svg(svg_file)
-    return svg_file
-
-
-def pcb_to_svg(input_file):
-    """Run kicad-cli to convert the input pcb to svg, and check it ran correctly"""
-    # For some reason kicad-cli (or maybe just the flatpak version) can't write
-    # to tmp files.
-    output_path = default_build_dir / input_file.with_suffix(".svg").name
-
-    # Define the kicad-cli command
-    command = [
-        "kicad-cli",
-        "pcb",
-        "export",
-        "svg",
-        "--exclude-drawing-sheet",
-        "--drill-shape-opt",
-        "1",
-        "--layers",
-        "Edge.Cuts",
-        "--output",
-        str(output_path),
-        str(input_file),
-    ]
-    try:
-        print("Running kicad-cli to convert .kicad_pcb file into svg")
-        print(output_path)
-        subprocess.run(command, check=True, text=True)
-        # print(list(tmpdir.walk()))
-        return output_path
-    except FileNotFoundError:
-        print(
-            "Error: The 'kicad-cli' command was not found. Please ensure KiCad is installed and the executable is in your PATH, or provide an svg."
-        )
-        sys.exit(1)
-    except OSError as e:
-        if e.errno == 8:  # Exec format error
-            print(
-                "Error: Unable to execute 'kicad-cli'. This may be due to an architecture mismatch or a corrupted executable."
-            )
-        else:
-            print(f"Error: An unexpected OS error occurred: {e}")
-        sys.exit(1)
-    except subprocess.CalledProcessError as e:
-        print("An error occurred while running kicad-cli:", e)
-        print("Error output:", e.stderr)
-        sys.exit(1)
-
-
 def dxf_to_svg(input_file):
     """Run inkscape to convert the input dxf to svg, and check it ran correctly"""
     output_path = default_build_dir / input_file.with_suffix(".svg").name
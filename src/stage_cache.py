@@ -0,0 +1,194 @@
+"""Memoisation of build stages on the params they read.
+
+Each memoised stage takes the Config it is built with as its first argument,
+and declares the params it reads (including through the helpers it calls). It
+is only given those params, so reading any other is an error rather than a
+stale result. Its result is keyed on the values of those params and on the
+keys of the results its shape arguments came from, so the keys chain back to
+the input outline. After a config change, only the stages
+reading a changed param, and the stages downstream of them, are recomputed.
+
+Results are kept in memory for the life of the process (e.g. in watch mode),
+and stages marked with disk=True are also stored in the BuildCache set by
+use_build_cache, so separate runs can reuse them.
+"""
+import json
+import weakref
+from collections import OrderedDict
+from functools import wraps
+
+try:
+    import profiling
+    from build_cache import cache_key
+except ImportError:
+    from . import profiling
+    from .build_cache import cache_key
+
+# Whole solids can be large, so only keep the most recent results.
+max_memory_entries = 64
+
+_memory = OrderedDict()
+# Key of the stage result (or input) each shape came from, by object id.
+# Shapes compare equal to their reversed copies, so they can't be dict keys.
+_sources = {}
+_build_cache = None
+# Number of times a stage took a fallback that its params don't determine.
+_fallbacks = 0
+
+
+def use_build_cache(build_cache):
+    """Also store and load results of disk=True stages in build_cache, or
+    only in memory if None."""
+    global _build_cache
+    _build_cache = build_cache
+
+
+def set_source(shape, key):
+    """Record shape as coming from the input identified by key (e.g. a file
+    hash), so stages using it can be memoised."""
+    i = id(shape)
+
+    def forget(ref):
+        # The id may have been reused by a newer shape by now.
+        if _sources.get(i, (None,))[0] is ref:
+            del _sources[i]
+
+    _sources[i] = (weakref.ref(shape, forget), key)
+    return shape
+
+
+def source(shape):
+    """The key shape came from, or None."""
+    ref, key = _sources.get(id(shape), (None, None))
+    return key if ref is not None and ref() is shape else None
+
+
+def shape_key(shape):
+    """Hashable key of shape, for memoising on it. Shapes themselves hash and
+    compare equal to reversed copies of them, and change if moved in place,
+    so this is the key shape came from (see source) if known, or else its
+    underlying shape with its current location and orientation."""
+    key = source(shape)
+    if key is not None:
+        return key
+    return (
+        shape.wrapped.TShape(),
+        shape.location.to_tuple(),
+        shape.wrapped.Orientation(),
+    )
+
+
+def lru_cache_on_shapes(maxsize=32):
+    """Decorator like functools.lru_cache, for functions of shapes (and other
+    hashable arguments), keyed on the shapes by shape_key."""
+
+    def decorator(f):
+        memory = OrderedDict()
+
+        @wraps(f)
+        def wrapper(*args):
+            key = tuple(shape_key(a) if _is_shape(a) else a for a in args)
+            if key in memory:
+                memory.move_to_end(key)
+                return memory[key]
+            result = f(*args)
+            memory[key] = result
+            while len(memory) > maxsize:
+                memory.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = memory.clear
+        return wrapper
+
+    return decorator
+
+
+def took_fallback():
+    """Record that the running stages took a fallback that isn't determined by
+    their params (e.g. because an operation timed out), so their results
+    aren't cached."""
+    global _fallbacks
+    _fallbacks += 1
+
+
+def fallback_count():
+    """Number of fallbacks taken so far, to tell whether any were taken while
+    building something."""
+    return _fallbacks
+
+
+def clear():
+    _memory.clear()
+
+
+def memoised(name, params, disk=False):
+    """Decorator memoising a stage on its arguments and the values of the
+    params it reads from the Config passed as its first argument.
+
+    Calls with a shape argument that didn't come from a memoised stage (or
+    set_source) can't be keyed, so run uncached. Results must not be modified
+    in place by callers.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(cfg, *args, **kwargs):
+            cfg = cfg.restricted(params, scope=f"stage '{name}'")
+            arg_keys = [_arg_key(a) for a in args]
+            arg_keys += [(k, _arg_key(v)) for k, v in sorted(kwargs.items())]
+            if any(k is None for k in arg_keys):
+                return f(cfg, *args, **kwargs)
+            key = cache_key(name, json.dumps(arg_keys, default=str), dict(cfg))
+
+            if key in _memory:
+                _memory.move_to_end(key)
+                profiling.count("stage cache hits")
+                return _memory[key]
+            result = None
+            if disk and _build_cache is not None:
+                shapes = _build_cache.load(key)
+                if shapes is not None:
+                    profiling.count("stage cache hits")
+                    (result,) = shapes
+            if result is None:
+                profiling.count("stage cache misses")
+                fallbacks = _fallbacks
+                result = f(cfg, *args, **kwargs)
+                if _fallbacks != fallbacks:
+                    return result
+                if disk and _build_cache is not None and _is_shape(result):
+                    _build_cache.store(key, [result])
+
+            _remember(key, result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _remember(key, result):
+    _memory[key] = result
+    while len(_memory) > max_memory_entries:
+        _memory.popitem(last=False)
+    if _is_shape(result):
+        set_source(result, key)
+    elif isinstance(result, (list, tuple)):
+        for i, r in enumerate(result):
+            if _is_shape(r):
+                set_source(r, f"{key}/{i}")
+
+
+def _arg_key(arg):
+    """JSON-able description of an argument, or None if it is a shape of
+    unknown origin."""
+    if _is_shape(arg):
+        return source(arg)
+    if isinstance(arg, (list, tuple)):
+        keys = [_arg_key(a) for a in arg]
+        return None if any(k is None for k in keys) else keys
+    return repr(arg)
+
+
+def _is_shape(obj):
+    return hasattr(obj, "wrapped") and hasattr(obj, "faces")
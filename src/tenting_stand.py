@@ -1,16 +1,16 @@
 import math
 from dataclasses import dataclass
-from functools import cache
+from functools import cache, lru_cache
 
 from build123d import *
 
-# Operating under the assumption that the other script will end up directly
-# updating this dict for user preferences.
+# The hinge and flaps are built by a TentingStandBuilder, from
+# tenting_stand_params. The helpers here take its Config as their first
+# argument, cfg.
 try:
-    from default_params import default_params as cfg
+    from profiling import profiled, stage
 except ImportError:
-    from .default_params import default_params as cfg
-
+    from .profiling import profiled, stage
 
 
 # If I wanted to make this more modular, I could probably put the default
@@ -24,6 +24,21 @@ case_blocker_angle = 90 + 45
 tenting_stability_angle = 20
 velcro_width = 15
 hole_tolerance = 0.2
+# Gap between a flap and the smaller flaps folded into it.
+nesting_gap = 0.2
+# Length along the flap edge of the ridge holding the next flap out.
+flap_ridge_width = 5
+
+# The params the hinge and flaps are built from.
+tenting_stand_params = (
+    "base_z_thickness",
+    "wall_xy_thickness",
+    "tent_hinge_width",
+    "tent_hinge_bolt_l",
+    "tent_hinge_bolt_head_d",
+    "tent_hinge_nut_l",
+    "tent_hinge_nut_d",
+)
 
 if __name__ not in ["__main__", "__cq_main__", "temp"]:
     show_object = lambda *_, **__: None
@@ -57,9 +72,75 @@ class _Flap:
     tent_angle: int = 0
 
 
-@cache
-def case_hinge(wall_height, bolt_d, countersunk=True):
+class TentingStandBuilder:
+    """Builds the case hinge and tenting flaps from the params in
+    tenting_stand_params, and only those, so reading any other param is an
+    error. Hinges and flaps are memoised on the params and their arguments
+    (see _built). Get one with tenting_stand_builder.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg.restricted(tenting_stand_params, scope="the tenting stand")
+
+    def case_hinge(self, wall_height, bolt_d, countersunk=True):
+        """The hinge to attach to the case. The result is shared, so must not be
+        modified in place."""
+        return _built(self.cfg, _case_hinge, _round(wall_height), _round(bolt_d), countersunk)
+
+    def tenting_legs(self, flaps, case_len, bolt_d, wall_height):
+        """The tenting flaps (see _tenting_legs), longest first. The list is a
+        copy, but the flaps are shared, so must not be modified in place."""
+        return ShapeList(
+            _built(self.cfg, _tenting_legs, *_flap_args(flaps, case_len, bolt_d, wall_height))
+        )
+
+    def flap_footprints(self, flaps, case_len, bolt_d, wall_height):
+        """The 2D footprints on the XY plane of the flaps from tenting_legs,
+        closed, without building them. Shared like the flaps."""
+        return ShapeList(
+            _built(self.cfg, _flap_footprints, *_flap_args(flaps, case_len, bolt_d, wall_height))
+        )
+
+
+@lru_cache(maxsize=32)
+def _built(cfg, build, *args):
+    """build(cfg, *args), memoised for every builder in one bounded cache, so
+    only the most recently used hinges and flaps are kept."""
+    result = build(cfg, *args)
+    return tuple(result) if isinstance(result, list) else result
+
+
+def _round(value):
+    """value rounded to the nearest nanometre, so that lengths calculated
+    slightly differently (e.g. from a bounding box) are the same key."""
+    return round(value, 6)
+
+
+def _flap_args(flaps, case_len, bolt_d, wall_height):
+    flaps = tuple(tuple(_round(v) for v in flap) for flap in flaps)
+    return flaps, _round(case_len), _round(bolt_d), _round(wall_height)
+
+
+@lru_cache(maxsize=32)
+def _builder(cfg):
+    return TentingStandBuilder(cfg)
+
+
+def tenting_stand_builder(cfg):
+    """The TentingStandBuilder for cfg. Builders are cheap, as what they build
+    is memoised by _built rather than in them."""
+    return _builder(cfg.restricted(tenting_stand_params))
+
+
+def _case_hinge(cfg, wall_height, bolt_d, countersunk=True):
     """Countersink covers whether both to countersink and create nut holes"""
+    bolt_l = cfg["tent_hinge_bolt_l"]  # Includes head, assuming countersunk
+    # https://engineersbible.com/countersunk-socket-metric/
+    bolt_head_d = cfg["tent_hinge_bolt_head_d"]
+    # https://amesweb.info/Fasteners/Metric_Hex_Nuts/Metric-Hex-Nut-Dimensions.aspx
+    nut_d = cfg["tent_hinge_nut_d"]
+    nut_l = cfg["tent_hinge_nut_l"]
+    hinge_width_y = cfg["tent_hinge_width"]
     _, hinge_face, outer = _base_faces(bolt_d, wall_height)
 
     case_connector = Rectangle(
@@ -106,72 +187,114 @@ def case_hinge(wall_height, bolt_d, countersunk=True):
         out -= nut_hole
     h = outer.radius
     show_object(out, name="case_hinge")
-
-    out.__hash__ = lambda: hash(id(hash))
     return out
 
 
-def tenting_legs(
-    flaps_: list[tuple[int, int, int]], case_len, bolt_d, wall_height, fillet_end=True
+@profiled("tenting_legs")
+def _tenting_legs(
+    cfg, flaps_: list[tuple[int, int, int]], case_len, bolt_d, wall_height
 ):
     """Create legs and hinges for tenting the keyboard. case_len is the X length of the case, and is used to calculate the optimal angle for the leg to open to so that it is 20 degrees past vertical on the desk."""
-    flaps = [_Flap(*f) for f in flaps_]
+    bolt_l = cfg["tent_hinge_bolt_l"]
+    hinge_width_y = cfg["tent_hinge_width"]
     bolthole, _, outer = _base_faces(bolt_d, wall_height)
-    # Go through from longest to shortest
-    flaps.sort(key=lambda f: f.len, reverse=True)
+    flaps, hinge_y_offsets, outlines = _flap_layout(cfg, flaps_, bolt_d, wall_height)
     out = []
     for i, f in enumerate(flaps):
-        hinge_y_offset = hinge_width_y * (i + 1) + 0.2 * (i + 1)
-        # flap_hinge_width = bolt_l - hinge_y_offset*2
-        flap_hinge = extrude(
-            Plane.XZ * _flap_hinge_face(case_len, f.len, wall_height, bolt_d),
-            hinge_width_y,
-        )
-        flap_hinge.move(Loc((0, -hinge_y_offset)))
-        flap_hinge.move(Loc((0, bolt_l / 2)))
-        flap_hinge += mirror(flap_hinge, Plane.XZ)
-        near_len = flap_hinge.bounding_box().size.Y
-        flap = -Plane.YX * _flap(
-            f,
-            near_len,
-            outer.radius + cfg["wall_xy_thickness"],
-            inner=i > 0,
-            innermost=(i + 1 == len(flaps)),
-            outermost=i == 0,
-            fillet_end=fillet_end,
-        )
-        flap = flap.move(Loc((0, 0, -outer.radius)))
-        flap += flap_hinge
+        with stage(f"flap_{i + 1}") as s:
+            flap_hinge = extrude(
+                Plane.XZ * _flap_hinge_face(case_len, f.len, wall_height, bolt_d),
+                hinge_width_y,
+            )
+            flap_hinge.move(Loc((0, -hinge_y_offsets[i])))
+            flap_hinge.move(Loc((0, bolt_l / 2)))
+            flap_hinge += mirror(flap_hinge, Plane.XZ)
+            # The smaller flaps fold into this one, with their hinges between
+            # this one's.
+            flap = -Plane.YX * _flap(
+                cfg,
+                f,
+                outlines[i],
+                nested=outlines[i + 1 :],
+                inner=i > 0,
+                innermost=(i + 1 == len(flaps)),
+                outermost=i == 0,
+            )
+            flap = flap.move(Loc((0, 0, -outer.radius)))
+            flap += flap_hinge
+            if i + 1 < len(flaps):
+                # The ridges on the smaller flaps can reach the hinges too.
+                notches = -Plane.YX * _ridge_notches(cfg, outlines[i + 1 :])
+                flap -= notches.move(Loc((0, 0, -outer.radius)))
+            s.result = flap
         out.append(flap)
 
-    case_hinge_ = case_hinge(wall_height, bolt_d, countersunk=False)
-    bolthole_cutout = _bolthole_cutout(bolthole)
-    # Cut smaller flaps out of the larger ones.
-    for i, flap in enumerate(out):
-        for inner in out[i + 1 :]:
-            # out[i] -= inner
-            out[i] -= offset(inner, 0.2)
-        # Cutting this out before the scaled inner causes invalid geom.
-        out[i] -= bolthole_cutout
-
-        finger_ridge = _finger_opening_ridge(flap)
-        # show_all()
-        out[i] -= finger_ridge
-
-        if i + 1 < len(out):  # From all but shortest
-            # Ensure the innermost divot isn't being left out as a floating square
-            d = ((-Plane.YX * _velcro_divot(flaps[-1]))).move(
-                Loc((0, 0, -outer.radius))
-            )
-            out[i] -= d
+    bolthole_cutout = _bolthole_cutout(cfg, bolthole)
+    with stage("flap_cutouts") as s:
+        for i, flap in enumerate(out):
+            out[i] -= bolthole_cutout
+
+            finger_ridge = _finger_opening_ridge(cfg, flap)
+            # show_all()
+            out[i] -= finger_ridge
 
-        show_object(out[i], name=f"flaps{i}")
+            if i + 1 < len(out):  # From all but shortest
+                # Ensure the innermost divot isn't being left out as a floating square
+                d = ((-Plane.YX * _velcro_divot(cfg, flaps[-1]))).move(
+                    Loc((0, 0, -outer.radius))
+                )
+                out[i] -= d
 
-        # show_object(out[i].rotate(Axis.Y, -70), name=f"flaps{i}")
+            show_object(out[i], name=f"flaps{i}")
+
+            # show_object(out[i].rotate(Axis.Y, -70), name=f"flaps{i}")
+        s.result = out
 
     return ShapeList(out)
 
 
+def _flap_layout(cfg, flaps_, bolt_d, wall_height):
+    """The flaps, longest first, with the Y offset of the hinges and the 2D
+    outline of each."""
+    flaps = [_Flap(*f) for f in flaps_]
+    _, _, outer = _base_faces(bolt_d, wall_height)
+    # Go through from longest to shortest
+    flaps.sort(key=lambda f: f.len, reverse=True)
+    hinge_y_offsets = [
+        (cfg["tent_hinge_width"] + nesting_gap) * (i + 1) for i in range(len(flaps))
+    ]
+    # Each flap is as wide as its pair of hinges at the near end.
+    outlines = [
+        _flap_outline(
+            f,
+            cfg["tent_hinge_bolt_l"] - 2 * y,
+            outer.radius + cfg["wall_xy_thickness"],
+        )
+        for f, y in zip(flaps, hinge_y_offsets)
+    ]
+    return flaps, hinge_y_offsets, outlines
+
+
+def _flap_footprints(cfg, flaps_, case_len, bolt_d, wall_height):
+    """What _tenting_legs builds, seen from above: the outline of each flap
+    with its hinges, and the ridge on each inner flap. These are from the same
+    2D profiles as the flaps, so the fillets don't need projecting."""
+    flaps, hinge_y_offsets, outlines = _flap_layout(cfg, flaps_, bolt_d, wall_height)
+    out = []
+    for i, (f, y, outline) in enumerate(zip(flaps, hinge_y_offsets, outlines)):
+        profile = _flap_hinge_face(case_len, f.len, wall_height, bolt_d).bounding_box()
+        hinge = Rectangle(
+            profile.size.X, cfg["tent_hinge_width"], align=(Align.MIN, Align.MAX)
+        ).move(Loc((profile.min.X, cfg["tent_hinge_bolt_l"] / 2 - y)))
+        footprint = -Plane.YX * outline + hinge + mirror(hinge, Plane.XZ)
+        if i > 0:
+            footprint += -Plane.YX * (
+                _ridge_plane(outline) * _ridge_face(flap_ridge_width)
+            )
+        out.append(footprint)
+    return out
+
+
 @cache
 def _base_faces(bolt_d, wall_height):
     outer = Circle(radius=(wall_height) / 2)
@@ -192,7 +315,8 @@ def _base_faces(bolt_d, wall_height):
     return bolthole, hinge_face, outer
 
 
-def _bolthole_cutout(bolthole):
+def _bolthole_cutout(cfg, bolthole):
+    mechanism_length = cfg["tent_hinge_bolt_l"]
     bolthole_cutout = extrude(Plane.XZ * (bolthole), mechanism_length / 2)
     bolthole_cutout.move(
         Loc(
@@ -212,7 +336,7 @@ def _calc_leg_open_angle(case_len, flap_len):
     return math.degrees(math.acos(flap_len / case_len)) + tenting_stability_angle
 
 
-def _finger_opening_ridge(flap) -> None:
+def _finger_opening_ridge(cfg, flap) -> None:
     # Cut out a ridge for finger to open the flap
     topright_edge = (
         flap.faces().filter_by(Axis.Z).sort_by(Axis.Z).last.edges().sort_by(Axis.Y).last
@@ -259,16 +383,8 @@ def _flap_hinge_face(case_len, flap_len, wall_height, bolt_d):
     return flap_hinge_face
 
 
-def _flap(
-    f: _Flap,
-    width_near,
-    hinge_size,
-    inner=True,
-    innermost=False,
-    outermost=False,
-    fillet_end=True,
-):
-    thickness = cfg["base_z_thickness"]
+def _flap_outline(f: _Flap, width_near, hinge_size):
+    """2D outline of a flap, with the hinge end centered along the X axis."""
     # Extend straight until the edge of hinge_size, then trapezoid to the end
     pts = [
         # ml, bl, br, mr, tr, tl
@@ -289,7 +405,27 @@ def _flap(
             end_slope = PolarLine(pts[-1], hypot, f.tent_angle)
             pts[-2] = end_slope @ 1
 
-    face = Polygon(*pts, align=None)
+    return Polygon(*pts, align=None)
+
+
+def _flap(
+    cfg,
+    f: _Flap,
+    outline,
+    nested=(),
+    inner=True,
+    innermost=False,
+    outermost=False,
+):
+    """A flap extruded from outline, with room cut out for the nested
+    outlines of the smaller flaps that fold into it."""
+    thickness = cfg["base_z_thickness"]
+    hinge_width_y = cfg["tent_hinge_width"]
+    width_near = outline.edges().sort_by(Axis.Y).first.length
+
+    face = outline
+    for n in nested:
+        face -= offset(n, nesting_gap)
     flap = extrude(face, thickness)
     # Cut out gap on inner edge for strap to fit through against the hinge
     # Extruding slightly less than total so that the shadow is still cut out of
@@ -300,31 +436,20 @@ def _flap(
     )
 
     if innermost:
-        flap -= _velcro_divot(f)
+        flap -= _velcro_divot(cfg, f)
 
     if inner:
         # Add a ridge to hold the next flap out in place when closed. Innermost
         # flap should have velcro to the PCB to hold it in place.
-        edge = face.edges().sort_by(Axis.X).first
-        ridge_len = 5
-        plane = Plane(
-            # Origin just before the end. Edge goes from end to start, so -ve position
-            origin=edge.location_at(
-                ridge_len + 5, position_mode=PositionMode.LENGTH
-            ).position,
-            x_dir=edge % 0.5,
-            y_dir=edge.normal(),
-        )
         ridge = _ridge(
-            ridge_len,
+            flap_ridge_width,
             thickness / 2,
         )
-        ridge = plane * ridge
+        ridge = _ridge_plane(outline) * ridge
         flap += ridge
 
     end_edges = flap.edges().filter_by(Plane.XY).group_by(Axis.Y)[-1]
-    if fillet_end:
-        flap = fillet(end_edges, thickness / 2.1)
+    flap = fillet(end_edges, thickness / 2.1)
 
     return flap
 
@@ -351,24 +476,52 @@ def _hinge_blocker(outer):
     return blocker
 
 
-def _ridge(ridge_width, thickness) -> None:
-    """Width = size along the edge it's on"""
-    # Thick enough for chamfer to not fail, and pegged to width for that same
-    # reason.
-    ridge_len = 3
-    ridge_face = Rectangle(ridge_width, ridge_len * 2)
+def _ridge_plane(outline):
+    """Plane of the ridge on the side of an inner flap with this outline."""
+    edge = outline.edges().sort_by(Axis.X).first
+    return Plane(
+        # Origin just before the end. Edge goes from end to start, so -ve position
+        origin=edge.location_at(
+            flap_ridge_width + 5, position_mode=PositionMode.LENGTH
+        ).position,
+        x_dir=edge % 0.5,
+        y_dir=edge.normal(),
+    )
+
+
+# Thick enough for chamfer to not fail, and pegged to width for that same
+# reason.
+ridge_depth = 3
+
+
+def _ridge_notches(cfg, outlines):
+    """Room for the ridges on the flaps with these outlines, to cut from the
+    flap they fold into."""
+    notches = [
+        _ridge_plane(o) * offset(_ridge_face(flap_ridge_width), nesting_gap)
+        for o in outlines
+    ]
+    return extrude(Sketch() + notches, cfg["base_z_thickness"] / 2 + nesting_gap)
+
+
+def _ridge_face(ridge_width):
     # Remove half to form half
     # ridge_face = split(ridge_face)
-    ridge = extrude(ridge_face, thickness)
+    return Rectangle(ridge_width, ridge_depth * 2)
+
+
+def _ridge(ridge_width, thickness) -> None:
+    """Width = size along the edge it's on"""
+    ridge = extrude(_ridge_face(ridge_width), thickness)
     top_curve = (
         ridge.edges().group_by(Axis.Z)[-1].filter_by(Axis.X).sort_by(Axis.Y).first
     )
-    ridge = chamfer(top_curve, min(ridge_len, thickness) - 0.1)
+    ridge = chamfer(top_curve, min(ridge_depth, thickness) - 0.1)
 
     return ridge
 
 
-def _velcro_divot(flap):
+def _velcro_divot(cfg, flap):
     # Cut out a divot to allow velcro to sit without affecting closing of the
     # case
     divot = Rectangle(velcro_width, velcro_width, align=(Align.CENTER, Align.MAX)).move(
@@ -377,19 +530,10 @@ def _velcro_divot(flap):
     return extrude(divot, -cfg["base_z_thickness"] * 0.5)
 
 
-bolt_l = cfg["tent_hinge_bolt_l"]  # Includes head, assuming countersunk
-bolt_d = cfg["tent_hinge_bolt_d"]
-bolt_head_d = cfg[
-    "tent_hinge_bolt_head_d"
-]  # https://engineersbible.com/countersunk-socket-metric/
-nut_d = cfg[
-    "tent_hinge_nut_d"
-]  # https://amesweb.info/Fasteners/Metric_Hex_Nuts/Metric-Hex-Nut-Dimensions.aspx
-nut_l = cfg["tent_hinge_nut_l"]
-mechanism_length = bolt_l
-
-hinge_width_y = cfg["tent_hinge_width"]
-
 if __name__ in ["temp", "__cq_main__", "__main__"]:
-    tenting_legs([[40, 90, 10], [30, 60, 30], [20, 30, 30]], 144.4, 3, 7.4)
-    case_hinge(7.4, 3)
+    from config import Config
+    from default_params import default_params
+
+    builder = tenting_stand_builder(Config(default_params))
+    builder.tenting_legs([[40, 90, 10], [30, 60, 30], [20, 30, 30]], 144.4, 3, 7.4)
+    builder.case_hinge(7.4, 3)
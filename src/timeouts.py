@@ -0,0 +1,108 @@
+"""Time limits for single CAD operations.
+
+OCCT can't be interrupted from Python, and on some outlines an operation (e.g.
+a tapered extrude or a boolean) runs for a very long time before failing.
+with_timeout runs the operation in a forked copy of this process instead,
+which is killed if it runs out of time, so the caller can take a fallback
+rather than tie up the build indefinitely.
+
+Forking and sending the result back costs time and round trips the result
+through BREP, so without a time limit set by set_time_limit (the default),
+operations are just run in this process.
+"""
+import io
+import multiprocessing
+
+from build123d import Part, Shape, export_brep
+from OCP.BRep import BRep_Builder
+from OCP.BRepTools import BRepTools
+from OCP.TopoDS import TopoDS_Shape
+
+
+# Seconds operations run with with_timeout may take, or 0 for no limit.
+_time_limit = 0
+
+
+class OperationTimeout(TimeoutError):
+    """An operation didn't finish within its time limit."""
+
+
+def set_time_limit(seconds):
+    """Limit operations run with with_timeout to seconds, or remove the limit
+    if 0 or None."""
+    global _time_limit
+    _time_limit = seconds or 0
+
+
+def time_limit():
+    return _time_limit
+
+
+def with_timeout(f, *args, **kwargs):
+    """Return f(*args, **kwargs), raising OperationTimeout if it takes longer
+    than the time limit. Exceptions raised by f are raised here too.
+
+    f runs in a forked child process, so its arguments needn't be picklable,
+    but its result must be a shape or picklable. Without a time limit, or
+    where processes can't be forked (Windows), f is just called.
+    """
+    seconds = _time_limit
+    if not seconds or "fork" not in multiprocessing.get_all_start_methods():
+        return f(*args, **kwargs)
+    name = getattr(f, "__name__", repr(f))
+    ctx = multiprocessing.get_context("fork")
+    receiver, sender = ctx.Pipe(duplex=False)
+    child = ctx.Process(target=_run, args=(sender, f, args, kwargs))
+    child.start()
+    sender.close()
+    try:
+        if not receiver.poll(seconds):
+            raise OperationTimeout(f"{name} took longer than {seconds} s")
+        succeeded, value = receiver.recv()
+    except EOFError:
+        child.join()
+        raise RuntimeError(f"{name} crashed (exit code {child.exitcode})") from None
+    finally:
+        if child.is_alive():
+            child.kill()
+        child.join()
+        receiver.close()
+    if not succeeded:
+        raise value
+    return _unpack(value)
+
+
+def _run(sender, f, args, kwargs):
+    try:
+        result = (True, _pack(f(*args, **kwargs)))
+    except Exception as e:
+        result = (False, e)
+    try:
+        sender.send(result)
+    except Exception as e:
+        # The result or exception couldn't be pickled.
+        sender.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Brep:
+    """A shape sent as BREP text, like the build cache stores them. Pickling
+    uses OCCT's binary format, which fails to read back some shapes."""
+
+    def __init__(self, shape):
+        data = io.BytesIO()
+        export_brep(shape, data)
+        self.data = data.getvalue()
+        self.is_part = isinstance(shape, Part)
+
+    def shape(self):
+        shape = TopoDS_Shape()
+        BRepTools.Read_s(shape, io.BytesIO(self.data), BRep_Builder())
+        return Part(shape) if self.is_part else Shape.cast(shape)
+
+
+def _pack(value):
+    return _Brep(value) if isinstance(value, Shape) else value
+
+
+def _unpack(value):
+    return value.shape() if isinstance(value, _Brep) else value
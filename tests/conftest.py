@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The modules in src import each other as top level modules when run as
+# scripts, so import them the same way here.
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
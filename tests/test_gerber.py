@@ -0,0 +1,169 @@
+from pathlib import Path
+
+import pytest
+import svgpathtools as svg
+
+import gerber
+
+fixtures = Path(__file__).parent / "fixtures"
+
+
+def counts(curves):
+    return {
+        kind: sum(isinstance(c, kind) for c in curves) for kind in (svg.Line, svg.Arc)
+    }
+
+
+def assert_closed(curves, tolerance=1e-6):
+    """Each curve starts where the one before it ends, all the way around."""
+    for curve, following in zip(curves, curves[1:] + curves[:1]):
+        assert abs(curve.end - following.start) < tolerance
+
+
+def test_kicad_multi_quadrant_mm(capsys):
+    curves = gerber.read_outline(fixtures / "gerber_rounded_rect.gm1")
+
+    assert counts(curves) == {svg.Line: 4, svg.Arc: 4}
+    assert_closed(curves)
+    # Y is flipped, so the board is drawn downwards from the origin.
+    assert [c.start for c in curves] == pytest.approx(
+        [5, 35, 40 - 5j, 40 - 15j, 35 - 20j, 5 - 20j, -15j, -5j]
+    )
+    for arc in (c for c in curves if isinstance(c, svg.Arc)):
+        assert arc.radius.real == pytest.approx(5)
+        assert abs(arc.delta) == pytest.approx(90)
+        # Rounding the corners off, not cutting into them.
+        mid = arc.point(0.5)
+        assert not (5 < mid.real < 35 or -15 < mid.imag < -5)
+    # The mounting hole, while the flash and region are skipped.
+    assert "ignoring 1 shape(s) in gerber_rounded_rect.gm1" in capsys.readouterr().out
+
+
+def test_protel_single_quadrant_inches_trailing_zeros():
+    curves = gerber.read_outline(fixtures / "gerber_single_quadrant.gko")
+
+    assert counts(curves) == {svg.Line: 3, svg.Arc: 1}
+    assert_closed(curves)
+    assert [c.start for c in curves] == pytest.approx(
+        [0, 38.1, 38.1 - 25.4j, -25.4j]
+    )
+    # The two quadrants of the round end are joined into one arc.
+    (arc,) = (c for c in curves if isinstance(c, svg.Arc))
+    assert arc.center == pytest.approx(38.1 - 12.7j)
+    assert arc.radius.real == pytest.approx(12.7)
+    assert abs(arc.delta) == pytest.approx(180)
+    assert arc.point(0.5) == pytest.approx(50.8 - 12.7j)
+
+
+def test_incremental_coordinates(tmp_path):
+    path = tmp_path / "board.gbr"
+    path.write_text(
+        """%FSLIX24Y24*%
+        %MOMM*%
+        D10*
+        X10000Y10000D02*
+        X10000D01*
+        Y5000D01*
+        X-10000D01*
+        G75*
+        G03X0Y-5000I0J-2500D01*
+        M02*
+        """
+    )
+    curves = gerber.read_outline(path)
+
+    assert counts(curves) == {svg.Line: 3, svg.Arc: 1}
+    assert_closed(curves)
+    assert [c.start for c in curves] == pytest.approx([1 - 1j, 2 - 1j, 2 - 1.5j, 1 - 1.5j])
+    arc = curves[-1]
+    assert arc.center == pytest.approx(1 - 1.25j)
+    # Anticlockwise with Y up, so it bulges out of the left end of the board.
+    assert arc.point(0.5) == pytest.approx(0.75 - 1.25j)
+
+
+@pytest.mark.parametrize(
+    "value, coordinate_format, expected",
+    [
+        ("015", ("T", 2, 4), 1.5),
+        ("-0005", ("T", 2, 4), -0.05),
+        ("0", ("T", 2, 4), 0),
+        ("15000", ("L", 2, 4), 1.5),
+        ("-500", ("L", 2, 4), -0.05),
+        ("+1500000", ("L", 4, 6), 1.5),
+        ("1.25", ("L", 4, 6), 1.25),
+    ],
+)
+def test_coordinate_formats(value, coordinate_format, expected):
+    assert gerber._coordinate(value, coordinate_format) == pytest.approx(expected)
+
+
+def test_single_quadrant_center_is_unsigned():
+    # A quarter circle anticlockwise around 0, from 1 to 1j (Gerber coordinates).
+    (single,) = gerber._arc_curves(
+        1 + 0j, 1j, 1 + 0j, clockwise=False, multi_quadrant=False
+    )
+    (multi,) = gerber._arc_curves(
+        1 + 0j, 1j, -1 + 0j, clockwise=False, multi_quadrant=True
+    )
+
+    for arc in (single, multi):
+        assert arc.center == pytest.approx(0)
+        assert abs(arc.delta) == pytest.approx(90)
+    # The same unsigned offset in multi quadrant mode is a different circle.
+    (wrong,) = gerber._arc_curves(
+        1 + 0j, 1j, 1 + 0j, clockwise=False, multi_quadrant=True
+    )
+    assert wrong.center != pytest.approx(0)
+
+
+def test_full_circles():
+    halves = gerber._arc_curves(
+        2 + 0j, 2 + 0j, -2 + 0j, clockwise=True, multi_quadrant=True
+    )
+
+    assert len(halves) == 2
+    assert_closed(halves)
+    for arc in halves:
+        assert arc.center == pytest.approx(0)
+        assert abs(arc.delta) == pytest.approx(180)
+    # Both halves of a full circle are kept, rather than merged into nothing.
+    assert gerber._merge_arcs(halves, tolerance=0.01) == halves
+    # In single quadrant mode, an arc back to its start draws nothing.
+    assert gerber._arc_curves(2 + 0j, 2 + 0j, 2 + 0j, True, multi_quadrant=False) == []
+
+
+def test_merge_arcs():
+    quarters = [
+        gerber._arc_curves(start, end, -start, clockwise=False, multi_quadrant=True)[0]
+        for start, end in [(1 + 0j, 1j), (1j, -1 + 0j), (-1 + 0j, -1j)]
+    ]
+    other_circle = gerber._arc_curves(
+        -1j, -2j, -0.5j, clockwise=False, multi_quadrant=True
+    )
+    line = svg.Line(2j, 1 + 0j)
+
+    merged = gerber._merge_arcs([*quarters, *other_circle, line], tolerance=0.01)
+
+    assert len(merged) == 3
+    assert_closed(merged)
+    arc = merged[0]
+    assert (arc.start, arc.end) == (quarters[0].start, quarters[-1].end)
+    assert arc.center == pytest.approx(0)
+    assert abs(arc.delta) == pytest.approx(270)
+    assert merged[1:] == [*other_circle, line]
+
+
+def test_coordinates_before_format(tmp_path):
+    path = tmp_path / "board.gm1"
+    path.write_text("X0Y0D02*\nX1000Y0D01*\n%FSLAX24Y24*%\nM02*\n")
+
+    with pytest.raises(ValueError, match="before its format"):
+        gerber.read_outline(path)
+
+
+def test_nothing_drawn(tmp_path):
+    path = tmp_path / "board.gm1"
+    path.write_text("%FSLAX24Y24*%\n%MOMM*%\nX0Y0D02*\nX1000Y0D03*\nM02*\n")
+
+    with pytest.raises(ValueError, match="No outline found"):
+        gerber.read_outline(path)
@@ -0,0 +1,132 @@
+from pathlib import Path
+
+import pytest
+import svgpathtools as svg
+
+import kicad_pcb
+
+fixtures = Path(__file__).parent / "fixtures"
+
+
+def endpoints(curves):
+    return sorted(
+        (round(p.real, 6), round(p.imag, 6)) for c in curves for p in (c.start, c.end)
+    )
+
+
+def counts(curves):
+    return {
+        kind: sum(isinstance(c, kind) for c in curves) for kind in (svg.Line, svg.Arc)
+    }
+
+
+def test_kicad5_module_and_old_style_arcs(capsys):
+    curves = kicad_pcb.read_edge_cuts(fixtures / "kicad5_rounded_rect.kicad_pcb")
+
+    # 3 lines, 4 corner arcs and the right edge, drawn by a rotated module.
+    assert len(curves) == 8
+    assert counts(curves) == {svg.Line: 4, svg.Arc: 4}
+    assert endpoints(curves) == sorted(
+        2 * [(15, 10), (105, 10), (110, 15), (110, 55), (105, 60), (15, 60), (10, 55), (10, 15)]
+    )
+    for arc in (c for c in curves if isinstance(c, svg.Arc)):
+        assert arc.radius.real == pytest.approx(5)
+        assert abs(arc.delta) == pytest.approx(90)
+        # Rounding the corners off, not cutting into them.
+        mid = arc.point(0.5)
+        assert not (15 < mid.real < 105 or 15 < mid.imag < 55)
+    # The mounting hole cut out of the board.
+    assert "ignoring 1 shape(s) on Edge.Cuts" in capsys.readouterr().out
+
+
+def test_kicad7_poly_arcs(capsys):
+    curves = kicad_pcb.read_edge_cuts(fixtures / "kicad7_poly_arcs.kicad_pcb")
+
+    assert len(curves) == 4
+    assert counts(curves) == {svg.Line: 3, svg.Arc: 1}
+    assert [(c.start, c.end) for c in curves] == [
+        (0j, 80 + 0j),
+        (80 + 0j, 80 + 20j),
+        (80 + 20j, 20j),
+        (20j, 0j),
+    ]
+    (arc,) = (c for c in curves if isinstance(c, svg.Arc))
+    assert arc.center == pytest.approx(80 + 10j)
+    assert arc.point(0.5) == pytest.approx(90 + 10j)
+    # The hole drawn by the rotated footprint.
+    assert "ignoring 1 shape(s) on Edge.Cuts" in capsys.readouterr().out
+
+
+def test_footprint_curves_are_rotated_and_moved():
+    tokens = kicad_pcb._tokenize(
+        """"Test:Footprint" (layer "F.Cu")
+        (at 10 20 90)
+        (fp_line (start 0 0) (end 5 0) (layer "Edge.Cuts"))
+        (fp_arc (start 5 0) (mid 6 1) (end 5 2) (layer "Edge.Cuts"))
+        (fp_line (start 0 0) (end 0 5) (layer "F.SilkS"))
+        )"""
+    )
+    curves = kicad_pcb._footprint_curves(tokens)
+
+    # Rotated 90 degrees anticlockwise as displayed, which takes +X to -Y.
+    assert len(curves) == 2
+    line, arc = curves
+    assert isinstance(line, svg.Line)
+    assert (line.start, line.end) == (10 + 20j, 10 + 15j)
+    assert isinstance(arc, svg.Arc)
+    assert (arc.start, arc.end) == (10 + 15j, 12 + 15j)
+    assert arc.point(0.5) == pytest.approx(11 + 14j)
+    # The rest of the tokens are left for the board.
+    assert next(tokens, None) is None
+
+
+def test_footprint_without_rotation():
+    tokens = kicad_pcb._tokenize(
+        '(at 1.5 -2) (fp_rect (start 0 0) (end 2 1) (layer "Edge.Cuts")))'
+    )
+    curves = kicad_pcb._footprint_curves(tokens)
+
+    assert len(curves) == 4
+    assert endpoints(curves) == sorted(
+        2 * [(1.5, -2), (3.5, -2), (3.5, -1), (1.5, -1)]
+    )
+
+
+def test_outer_outline_keeps_largest_connected_shape():
+    def square(corner, size):
+        points = [corner + size * p for p in (0, 1, 1 + 1j, 1j)]
+        return [svg.Line(a, b) for a, b in zip(points, points[1:] + points[:1])]
+
+    hole = square(2 + 2j, 1)
+    board = square(0j, 10)
+    # Endpoints that are only within tolerance still join up.
+    board[1] = svg.Line(board[1].start + 0.005, board[1].end)
+
+    outline, ignored = kicad_pcb._outer_outline(hole + board, tolerance=0.01)
+
+    assert outline == board
+    assert ignored == 1
+
+
+def test_outer_outline_of_one_shape():
+    curves = [svg.Line(0j, 1 + 0j), svg.Line(1 + 0j, 1j), svg.Line(1j, 0j)]
+
+    assert kicad_pcb._outer_outline(curves, tolerance=0.01) == (curves, 0)
+
+
+def test_not_a_kicad_pcb(tmp_path):
+    path = tmp_path / "board.kicad_pcb"
+    path.write_text("(kicad_sch (version 20230121))")
+
+    with pytest.raises(ValueError, match="isn't a KiCad PCB"):
+        kicad_pcb.read_edge_cuts(path)
+
+
+def test_nothing_on_edge_cuts(tmp_path):
+    path = tmp_path / "board.kicad_pcb"
+    path.write_text(
+        '(kicad_pcb (version 20221018) (gr_line (start 0 0) (end 1 0) (layer "F.SilkS")))'
+    )
+
+    with pytest.raises(ValueError, match="No Edge.Cuts outline"):
+        kicad_pcb.read_edge_cuts(path)